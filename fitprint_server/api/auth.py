@@ -0,0 +1,58 @@
+from fastapi import Depends, Header, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+import logging
+from services.session_tokens import session_tokens, InvalidSessionToken
+
+logger = logging.getLogger(__name__)
+
+
+class SessionUser(BaseModel):
+    """The caller, as described by their session token"""
+    user_id: str
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    picture: Optional[str] = None
+    last_login: Optional[str] = None
+
+
+def optional_session(authorization: str = Header(default="")) -> Optional[SessionUser]:
+    """
+    The caller's session, checked in-process (no Google or DynamoDB call).
+
+    Requests without an Authorization header get None, so routes stay usable
+    by clients that don't send one yet; a bearer token that isn't a valid
+    session token is rejected with 401.
+    """
+    if not authorization:
+        return None
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    try:
+        claims = session_tokens.verify(authorization.split(" ", 1)[1])
+    except InvalidSessionToken as e:
+        logger.info(f"Rejected session token: {str(e)}")
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    return SessionUser(user_id=claims["sub"], **{k: v for k, v in claims.items() if k in SessionUser.model_fields})
+
+
+def require_session(session: Optional[SessionUser] = Depends(optional_session)) -> SessionUser:
+    """Like optional_session, but the request must carry a session token"""
+    if session is None:
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    return session
+
+
+def resolve_user_id(session: Optional[SessionUser], user_id: Optional[str]) -> str:
+    """
+    The user a request acts for: the session's user when there is one (a
+    different explicit user_id is refused), otherwise the user_id the client
+    sent.
+    """
+    if session is not None:
+        if user_id and user_id != session.user_id:
+            raise HTTPException(status_code=403, detail="user_id does not match the session")
+        return session.user_id
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required without a session token")
+    return user_id
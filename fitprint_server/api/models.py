@@ -15,7 +15,7 @@ class ItemKey(BaseModel):
 
 # Clothing-specific models
 class ClothingCreate(BaseModel):
-    user_id: str
+    user_id: Optional[str] = None  # taken from the session token when omitted
     brand: str
     image_file: str
 
@@ -68,6 +68,35 @@ class SustainabilityReportCreate(BaseModel):
     regional_alerts: RegionalAlerts
     alternative_ids: list[str]
 
+# Gemini output models, used to validate model responses before they're stored
+class BrandInfo(BaseModel):
+    brand: str
+    product_title: str = "Clothing Item"
+    product_description: str = ""
+    confidence: float = 0.0
+
+class ReportContent(BaseModel):
+    categories: Categories
+    overall_score: float
+    overall_description: str
+    regional_alerts: RegionalAlerts = RegionalAlerts()
+
+class SingleShotAnalysis(BaseModel):
+    brand_info: BrandInfo
+    report: ReportContent
+    search_query: str
+
+class AlternativeSuggestion(BaseModel):
+    name: str
+    brand: str
+    image_url: str = ""
+    sustainability_score: float
+    link: str = ""
+    why_sustainable: str = ""
+
+class AlternativeSuggestions(BaseModel):
+    alternatives: List[AlternativeSuggestion]
+
 # Image Upload Models
 class ImageUploadResponse(BaseModel):
     success: bool
@@ -106,3 +135,30 @@ class OutfitAnalysisResponse(BaseModel):
     alternatives: List[AlternativeProduct]
     analysis_id: str
     created_at: str
+
+# Batch analysis
+class BatchAnalysisItem(BaseModel):
+    filename: Optional[str] = None
+    analysis: Optional[OutfitAnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchAnalysisItem]
+    succeeded: int
+    failed: int
+
+# Asynchronous analysis jobs
+class AnalysisJobResponse(BaseModel):
+    analysis_id: str
+    status: str  # queued | running | completed | failed
+    created_at: str
+    updated_at: str
+    result: Optional[OutfitAnalysisResponse] = None
+    error: Optional[str] = None
+
+# Streaming analysis events (one JSON object per line)
+class AnalysisEvent(BaseModel):
+    # image_stored | brand_identified | report_ready | alternatives_found | persisted | error
+    event: str
+    analysis_id: str
+    data: Any = None
@@ -0,0 +1,50 @@
+from fastapi import HTTPException
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from typing import Any, Dict, List, Optional
+import base64
+import binascii
+import json
+from decimal import Decimal
+from database import FIELD_PATTERN
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def encode_cursor(last_evaluated_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Opaque continuation token for a DynamoDB LastEvaluatedKey (None on the last page).
+
+    The key is stored in DynamoDB's typed JSON so numeric key attributes
+    survive the round trip exactly.
+    """
+    if not last_evaluated_key:
+        return None
+    typed = {name: _serializer.serialize(value) for name, value in last_evaluated_key.items()}
+    return base64.urlsafe_b64encode(json.dumps(typed, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """ExclusiveStartKey for a cursor from encode_cursor; 400 if it isn't one"""
+    if not cursor:
+        return None
+    try:
+        typed = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        key = {name: _deserializer.deserialize(value) for name, value in typed.items()}
+    except (ValueError, TypeError, AttributeError, ArithmeticError, binascii.Error):
+        # ArithmeticError: decimal signals (Overflow, Inexact...) from a crafted number
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if any(isinstance(value, Decimal) and not value.is_finite() for value in key.values()):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Attribute names from a comma-separated ?fields= value (None means all); 400 if any is invalid"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if not FIELD_PATTERN.match(name)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid field names: {', '.join(invalid)}")
+    return names or None
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Optional
+import hmac
+import logging
+from botocore.exceptions import ClientError
+from config import settings
+from services.report_cache import report_cache, normalize_brand, normalize_product_type
+from services.resilience import CircuitOpenError
+from services.score_aggregates import score_aggregates
+from services.shopping_cache import search_query_cache, shopping_results_cache
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin_key(x_admin_key: str = Header(default="")):
+    """Check the X-Admin-Key header against ADMIN_API_KEY"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_API_KEY not set)")
+    if not hmac.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+# Create router for operational endpoints
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_key)])
+
+@router.get("/cache/reports")
+async def get_report_cache_stats():
+    """Hit/miss counters for the sustainability report cache"""
+    return report_cache.stats()
+
+@router.delete("/cache/reports")
+async def invalidate_report_cache(brand: Optional[str] = None, product_type: Optional[str] = None):
+    """
+    Invalidate cached sustainability reports.
+    
+    - no parameters: every cached report
+    - brand: every product type for that brand
+    - brand and product_type: a single entry
+    """
+    if product_type and not brand:
+        raise HTTPException(status_code=400, detail="product_type requires brand")
+    
+    key_prefix = ""
+    if brand:
+        key_prefix = f"{normalize_brand(brand)}|"
+        if product_type:
+            key_prefix += normalize_product_type({"product_title": product_type})
+    
+    try:
+        removed = await report_cache.invalidate(key_prefix)
+    except ClientError as e:
+        logger.error(f"Report cache invalidation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Cache invalidation failed: {str(e)}")
+    
+    return {"message": "Report cache invalidated", "key_prefix": key_prefix, "removed": removed}
+
+@router.get("/cache/shopping")
+async def get_shopping_cache_stats():
+    """Hit/miss counters for the search query and shopping results caches"""
+    return {"search_queries": search_query_cache.stats(), "shopping_results": shopping_results_cache.stats()}
+
+@router.delete("/cache/shopping")
+async def invalidate_shopping_cache():
+    """Invalidate every cached search query and shopping result"""
+    try:
+        removed = {
+            "search_queries": await search_query_cache.invalidate(),
+            "shopping_results": await shopping_results_cache.invalidate()
+        }
+    except ClientError as e:
+        logger.error(f"Shopping cache invalidation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Cache invalidation failed: {str(e)}")
+    
+    return {"message": "Shopping cache invalidated", "removed": removed}
+
+@router.post("/aggregates/scores/rebuild")
+async def rebuild_score_aggregates(segments: int = Query(8, ge=1, le=64)):
+    """Recompute the score summary from a parallel scan of every report"""
+    try:
+        return await score_aggregates.rebuild(segments)
+    except (ClientError, CircuitOpenError) as e:
+        logger.error(f"Score aggregate rebuild failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Rebuild failed: {str(e)}")
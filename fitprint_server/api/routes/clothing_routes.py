@@ -1,21 +1,24 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from datetime import datetime
+from typing import Optional
 import uuid
 from database import dynamodb_service
+from ..auth import SessionUser, optional_session, resolve_user_id
+from ..pagination import decode_cursor, encode_cursor, parse_fields
 from ..models import ClothingCreate, ClothingUpdate
 
-# Create router for clothing endpoints
-router = APIRouter(prefix="/clothing", tags=["clothing"])
+# Create router for clothing endpoints; a session token, when sent, must be valid
+router = APIRouter(prefix="/clothing", tags=["clothing"], dependencies=[Depends(optional_session)])
 
 @router.post("/")
-async def create_clothing_item(clothing: ClothingCreate):
-    """Create a new clothing item with auto-generated ID"""
+async def create_clothing_item(clothing: ClothingCreate, session: Optional[SessionUser] = Depends(optional_session)):
+    """Create a new clothing item with auto-generated ID (user_id defaults to the session's user)"""
     # Generate a unique clothing ID
     clothing_id = str(uuid.uuid4())
     
     item_data = {
         "clothing_id": clothing_id,
-        "user_id": clothing.user_id,
+        "user_id": resolve_user_id(session, clothing.user_id),
         "brand": clothing.brand,
         "image_file": clothing.image_file,
         "created_at": str(datetime.now().isoformat())
@@ -80,10 +83,21 @@ async def delete_clothing_item(clothing_id: str, brand: str):
         raise HTTPException(status_code=400, detail=result["error"])
 
 @router.get("/")
-async def list_clothing_items(limit: int = 100):
-    """List all clothing items"""
-    result = await dynamodb_service.scan_table(limit)
+async def list_clothing_items(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                              fields: Optional[str] = None):
+    """
+    List clothing items one page at a time.
+    
+    - cursor: next_cursor from the previous page (null on the last page)
+    - fields: comma-separated attributes to return, e.g. clothing_id,brand,overall_score,image_file
+    """
+    result = await dynamodb_service.scan_table(limit, exclusive_start_key=decode_cursor(cursor),
+                                               fields=parse_fields(fields))
     if result["success"]:
-        return {"items": result["items"], "count": len(result["items"])}
+        return {
+            "items": result["items"],
+            "count": len(result["items"]),
+            "next_cursor": encode_cursor(result["last_evaluated_key"])
+        }
     else:
         raise HTTPException(status_code=500, detail=result["error"])
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from datetime import datetime
+from typing import Optional
 import uuid
-from database import dynamodb_service
+from database import CLOTHING_REPORTS_INDEX, dynamodb_service
+from services.score_aggregates import score_aggregates
+from ..auth import optional_session
+from ..pagination import decode_cursor, encode_cursor, parse_fields
 from ..models import SustainabilityReportCreate, SustainabilityReport
 
-# Create router for sustainability report endpoints
-router = APIRouter(prefix="/sustainability", tags=["sustainability"])
+# Create router for sustainability report endpoints; a session token, when sent, must be valid
+router = APIRouter(prefix="/sustainability", tags=["sustainability"], dependencies=[Depends(optional_session)])
 
 @router.post("/reports")
 async def create_sustainability_report(report: SustainabilityReportCreate):
@@ -31,6 +35,7 @@ async def create_sustainability_report(report: SustainabilityReportCreate):
     
     result = await dynamodb_service.create_item(item_data, table_name="sustainability")
     if result["success"]:
+        await score_aggregates.record([item_data])
         return {
             "message": "Sustainability report created successfully",
             "report_id": report_id,
@@ -52,10 +57,12 @@ async def get_sustainability_report(report_id: str):
 @router.get("/reports/clothing/{clothing_id}")
 async def get_clothing_sustainability_report(clothing_id: str):
     """Get sustainability report for a specific clothing item"""
-    # Query by clothing_id - in production you'd want a GSI
-    result = await dynamodb_service.scan_table(1000, table_name="sustainability")
+    result = await dynamodb_service.query_all(
+        "clothing_id = :clothing_id", {":clothing_id": clothing_id},
+        table_name="sustainability", index_name=CLOTHING_REPORTS_INDEX
+    )
     if result["success"]:
-        clothing_reports = [item for item in result["items"] if item.get("clothing_id") == clothing_id]
+        clothing_reports = result["items"]
         if clothing_reports:
             return {"reports": clothing_reports, "count": len(clothing_reports)}
         else:
@@ -64,11 +71,23 @@ async def get_clothing_sustainability_report(clothing_id: str):
         raise HTTPException(status_code=500, detail=result["error"])
 
 @router.get("/reports")
-async def list_sustainability_reports(limit: int = 100):
-    """List all sustainability reports"""
-    result = await dynamodb_service.scan_table(limit, table_name="sustainability")
+async def list_sustainability_reports(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                                      fields: Optional[str] = None):
+    """
+    List sustainability reports one page at a time.
+    
+    - cursor: next_cursor from the previous page (null on the last page)
+    - fields: comma-separated attributes to return, e.g. report_id,brand,overall_score
+    """
+    result = await dynamodb_service.scan_table(limit, table_name="sustainability",
+                                               exclusive_start_key=decode_cursor(cursor),
+                                               fields=parse_fields(fields))
     if result["success"]:
-        return {"reports": result["items"], "count": len(result["items"])}
+        return {
+            "reports": result["items"],
+            "count": len(result["items"]),
+            "next_cursor": encode_cursor(result["last_evaluated_key"])
+        }
     else:
         raise HTTPException(status_code=500, detail=result["error"])
 
@@ -76,36 +95,18 @@ async def list_sustainability_reports(limit: int = 100):
 async def delete_sustainability_report(report_id: str):
     """Delete a sustainability report"""
     key = {"report_id": report_id}
-    result = await dynamodb_service.delete_item(key, table_name="sustainability")
+    result = await dynamodb_service.delete_item(key, table_name="sustainability", return_old=True)
     if result["success"]:
+        if result["item"]:
+            await score_aggregates.remove([result["item"]])
         return {"message": "Sustainability report deleted successfully"}
     else:
         raise HTTPException(status_code=400, detail=result["error"])
 
 @router.get("/scores/summary")
 async def get_sustainability_summary():
-    """Get summary statistics of sustainability scores"""
-    result = await dynamodb_service.scan_table(1000, table_name="sustainability")
-    if result["success"]:
-        reports = result["items"]
-        if not reports:
-            return {"message": "No sustainability reports found"}
-        
-        scores = [report.get("overall_score", 0) for report in reports if report.get("overall_score")]
-        if scores:
-            return {
-                "total_reports": len(reports),
-                "average_score": round(sum(scores) / len(scores), 2),
-                "highest_score": max(scores),
-                "lowest_score": min(scores),
-                "score_distribution": {
-                    "excellent": len([s for s in scores if s >= 4.0]),
-                    "good": len([s for s in scores if 3.0 <= s < 4.0]),
-                    "fair": len([s for s in scores if 2.0 <= s < 3.0]),
-                    "poor": len([s for s in scores if s < 2.0])
-                }
-            }
-        else:
-            return {"message": "No valid scores found in reports"}
-    else:
-        raise HTTPException(status_code=500, detail=result["error"])
+    """Get summary statistics of sustainability scores (maintained as reports are written; see services/score_aggregates.py)"""
+    try:
+        return await score_aggregates.summary()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare the single-shot Gemini analysis with the three-call path.
+
+Usage: python benchmark_single_shot.py IMAGE [IMAGE ...] [--runs 5]
+
+Calls Gemini for real (GEMINI_API_KEY must be set). The three-call path is
+timed the way the pipeline runs it: brand identification, then the report
+and search query concurrently. Token counts come from each response's
+usage_metadata via the llm.*_tokens metrics.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from services.fast_gemini_service import fast_gemini_service
+from services.metrics import metrics
+from services.s3_service import s3_service
+
+TOKEN_COUNTERS = ("llm.requests", "llm.prompt_tokens", "llm.output_tokens", "llm.total_tokens")
+
+
+async def three_calls(image):
+    vision = await fast_gemini_service.identify_brand_from_image(image["content"], mime_type=image["content_type"])
+    brand_info = vision["brand_info"]
+    report, _ = await asyncio.gather(
+        fast_gemini_service.generate_sustainability_report(brand_info["brand"], brand_info),
+        fast_gemini_service.generate_shopping_search_query(brand_info["brand"], brand_info)
+    )
+    return vision["success"] and report["success"]
+
+
+async def single_shot(image):
+    result = await fast_gemini_service.analyze_outfit(image["content"], mime_type=image["content_type"])
+    return result["success"]
+
+
+async def measure(mode, images, runs):
+    latencies = []
+    successes = 0
+    before = metrics.snapshot()["counters"]
+    for _ in range(runs):
+        for image in images:
+            started = time.perf_counter()
+            successes += bool(await mode(image))
+            latencies.append((time.perf_counter() - started) * 1000)
+    after = metrics.snapshot()["counters"]
+    usage = {name: (after.get(name, 0) - before.get(name, 0)) / len(latencies) for name in TOKEN_COUNTERS}
+    return {
+        "median_ms": statistics.median(latencies),
+        "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        "success_rate": successes / len(latencies),
+        **usage
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="+", help="Clothing photos to analyse")
+    parser.add_argument("--runs", type=int, default=5, help="Passes over the image set per mode")
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            images.append(await s3_service.process_image(f.read()))
+
+    print(f"🧪 {len(images)} images x {args.runs} runs per mode")
+    results = {
+        "three-call": await measure(three_calls, images, args.runs),
+        "single-shot": await measure(single_shot, images, args.runs)
+    }
+
+    print(f"{'mode':<12} {'median ms':>10} {'p95 ms':>10} {'ok':>6} {'calls':>6} {'in tok':>8} {'out tok':>8} {'total tok':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['median_ms']:>10.0f} {r['p95_ms']:>10.0f} {r['success_rate']:>6.0%} "
+              f"{r['llm.requests']:>6.1f} {r['llm.prompt_tokens']:>8.0f} {r['llm.output_tokens']:>8.0f} {r['llm.total_tokens']:>10.0f}")
+
+    baseline, candidate = results["three-call"], results["single-shot"]
+    print(f"📊 single-shot median latency: {candidate['median_ms'] / baseline['median_ms']:.0%} of three-call, "
+          f"tokens: {candidate['llm.total_tokens'] / max(baseline['llm.total_tokens'], 1):.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Brand accuracy vs. payload size for Gemini Vision input profiles.
+
+Usage: python benchmark_vision_profile.py labels.csv [--profiles full 1024:85 768:80 512:75 768:80:label]
+
+labels.csv has one "image_path,expected_brand" row per photo. A profile is
+MAX_EDGE:QUALITY[:CROP] (CROP is none, center or label); "full" sends the
+stored image as the pipeline did before vision derivatives. Calls Gemini for
+real (GEMINI_API_KEY must be set).
+"""
+import argparse
+import asyncio
+import csv
+import io
+import statistics
+import time
+
+from PIL import Image
+
+from services.fast_gemini_service import fast_gemini_service
+from services.metrics import metrics
+from services.report_cache import normalize_brand
+from services.s3_service import s3_service
+
+
+def build_payload(profile, stored_content):
+    if profile == "full":
+        return stored_content
+    max_edge, quality, *crop = profile.split(":")
+    image = Image.open(io.BytesIO(stored_content))
+    return s3_service.encode_vision_image(image, max_edge=int(max_edge), quality=int(quality),
+                                          crop=crop[0] if crop else "none")
+
+
+async def measure(profile, samples):
+    sizes, latencies, correct = [], [], 0
+    before = metrics.snapshot()["counters"].get("llm.prompt_tokens", 0)
+    for stored_content, expected_brand in samples:
+        payload = build_payload(profile, stored_content)
+        started = time.perf_counter()
+        result = await fast_gemini_service.identify_brand_from_image(payload, mime_type="image/jpeg")
+        latencies.append((time.perf_counter() - started) * 1000)
+        sizes.append(len(payload))
+        correct += normalize_brand(result["brand_info"].get("brand")) == normalize_brand(expected_brand)
+    prompt_tokens = metrics.snapshot()["counters"].get("llm.prompt_tokens", 0) - before
+    return {
+        "accuracy": correct / len(samples),
+        "kb": statistics.mean(sizes) / 1024,
+        "prompt_tokens": prompt_tokens / len(samples),
+        "median_ms": statistics.median(latencies)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labels", help="CSV of image_path,expected_brand")
+    parser.add_argument("--profiles", nargs="+", default=["full", "1024:85", "768:80", "512:75", "768:80:label"])
+    args = parser.parse_args()
+
+    samples = []
+    with open(args.labels, newline="") as f:
+        for path, expected_brand in csv.reader(f):
+            with open(path, "rb") as image_file:
+                processed = await s3_service.process_image(image_file.read())
+            samples.append((processed["content"], expected_brand))
+
+    print(f"🧪 {len(samples)} labelled images, {len(args.profiles)} profiles")
+    print(f"{'profile':<14} {'accuracy':>9} {'avg KB':>8} {'prompt tok':>11} {'median ms':>10}")
+    for profile in args.profiles:
+        r = await measure(profile, samples)
+        print(f"{profile:<14} {r['accuracy']:>9.0%} {r['kb']:>8.1f} {r['prompt_tokens']:>11.0f} {r['median_ms']:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
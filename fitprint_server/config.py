@@ -14,9 +14,37 @@ class Settings:
     # DynamoDB Configuration
     DYNAMODB_TABLE_NAME: str = os.getenv("DYNAMODB_TABLE_NAME", "fitprint-table")
     
+    USERS_TABLE_NAME: Optional[str] = os.getenv("USERS_TABLE_NAME")
+    
     # For local development (if using DynamoDB Local)
     DYNAMODB_ENDPOINT_URL: Optional[str] = os.getenv("DYNAMODB_ENDPOINT_URL")
     
+    # Shared cache table (partition key cache_key, TTL attribute expires_at)
+    CACHE_TABLE_NAME: str = os.getenv("CACHE_TABLE_NAME", "fitprint-cache")
+    
+    # Materialized score statistics for /sustainability/scores/summary (partition key aggregate_id)
+    AGGREGATES_TABLE_NAME: str = os.getenv("AGGREGATES_TABLE_NAME", "fitprint-aggregates")
+    
+    # Async analysis jobs: "dynamodb" (durable, shared) or "memory" (tests/local dev)
+    ANALYSIS_JOB_STORE: str = os.getenv("ANALYSIS_JOB_STORE", "dynamodb")
+    ANALYSIS_JOBS_TABLE_NAME: str = os.getenv("ANALYSIS_JOBS_TABLE_NAME", "analysis-jobs")
+    ANALYSIS_JOB_WORKERS: int = int(os.getenv("ANALYSIS_JOB_WORKERS", "4"))
+    ANALYSIS_JOB_QUEUE_SIZE: int = int(os.getenv("ANALYSIS_JOB_QUEUE_SIZE", "100"))
+    
+    # Ask Gemini for brand, report and search query in one call instead of three
+    # (overridable per request with ?single_shot=)
+    SINGLE_SHOT_ANALYSIS: bool = os.getenv("SINGLE_SHOT_ANALYSIS", "false").lower() == "true"
+    
+    # Batch analysis (/analysis/outfits/batch)
+    BATCH_MAX_IMAGES: int = int(os.getenv("BATCH_MAX_IMAGES", "20"))
+    BATCH_ANALYSIS_CONCURRENCY: int = int(os.getenv("BATCH_ANALYSIS_CONCURRENCY", "8"))
+    BATCH_VISION_GROUP_SIZE: int = int(os.getenv("BATCH_VISION_GROUP_SIZE", "4"))
+    # Extra time a batch gets for each image after the first (on top of ANALYSIS_DEADLINE_SECONDS)
+    BATCH_DEADLINE_SECONDS_PER_IMAGE: float = float(os.getenv("BATCH_DEADLINE_SECONDS_PER_IMAGE", "5"))
+    
+    # Worker threads (and connections) for blocking boto3 DynamoDB calls
+    DYNAMODB_POOL_SIZE: int = int(os.getenv("DYNAMODB_POOL_SIZE", "16"))
+    
     # S3 Configuration
     S3_BUCKET_NAME: str = os.getenv("S3_BUCKET_NAME", "fitprint-images")
     S3_REGION: str = os.getenv("S3_REGION", "us-west-2")
@@ -24,8 +52,84 @@ class Settings:
     # Google Custom Search API
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "YOUR_GOOGLE_API_KEY_HERE")
     GOOGLE_SEARCH_ENGINE_ID: str = os.getenv("GOOGLE_SEARCH_ENGINE_ID", "YOUR_SEARCH_ENGINE_ID_HERE")
+    SEARCH_BASE_URL: str = os.getenv("SEARCH_BASE_URL", "https://customsearch.googleapis.com/customsearch/v1")
+    # Max concurrent searches (and pooled keep-alive connections) per worker
+    SEARCH_MAX_IN_FLIGHT: int = int(os.getenv("SEARCH_MAX_IN_FLIGHT", "16"))
+    # Retries for 5xx responses (not 429 quota errors or timeouts, which may already be billed)
+    SEARCH_MAX_RETRIES: int = int(os.getenv("SEARCH_MAX_RETRIES", "1"))
+    # Result pages (10 results each) one shopping search may request, and how many are requested ahead
+    SEARCH_MAX_PAGES: int = int(os.getenv("SEARCH_MAX_PAGES", "3"))
+    SEARCH_SPECULATIVE_PAGES: int = int(os.getenv("SEARCH_SPECULATIVE_PAGES", "2"))
+    # Brand/store keyword lexicon used to classify search results
+    SEARCH_LEXICON_PATH: str = os.getenv(
+        "SEARCH_LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "services", "search_lexicon.json")
+    )
     
     # Gemini AI Configuration
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
+    # Max concurrent Gemini calls per worker; extra calls queue in the LLM client
+    GEMINI_MAX_IN_FLIGHT: int = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "32"))
+    
+    # Image sent to Gemini Vision: a small JPEG derivative of the upload
+    # (VISION_MAX_EDGE=0 sends the stored image instead). VISION_CROP is
+    # none, center or label (upper centre, where logos and neck labels sit)
+    VISION_MAX_EDGE: int = int(os.getenv("VISION_MAX_EDGE", "768"))
+    VISION_JPEG_QUALITY: int = int(os.getenv("VISION_JPEG_QUALITY", "80"))
+    VISION_CROP: str = os.getenv("VISION_CROP", "none")
+    VISION_CROP_FRACTION: float = float(os.getenv("VISION_CROP_FRACTION", "0.8"))
+    
+    # Sustainability report cache (brand + product type)
+    REPORT_CACHE_MAX_ENTRIES: int = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "1024"))
+    REPORT_CACHE_TTL_SECONDS: int = int(os.getenv("REPORT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
+    # Shopping caches: (brand + product type) -> search query, normalized query -> alternatives
+    SHOPPING_CACHE_MAX_ENTRIES: int = int(os.getenv("SHOPPING_CACHE_MAX_ENTRIES", "1024"))
+    SEARCH_QUERY_CACHE_TTL_SECONDS: int = int(os.getenv("SEARCH_QUERY_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    SHOPPING_RESULTS_CACHE_TTL_SECONDS: int = int(os.getenv("SHOPPING_RESULTS_CACHE_TTL_SECONDS", str(24 * 3600)))
+    
+    # Near-duplicate uploads (perceptual hash within this many bits) reuse the user's stored analysis
+    IMAGE_DEDUP_ENABLED: bool = os.getenv("IMAGE_DEDUP_ENABLED", "true").lower() == "true"
+    IMAGE_DEDUP_MAX_DISTANCE: int = int(os.getenv("IMAGE_DEDUP_MAX_DISTANCE", "6"))
+    # Users whose image hashes are kept in memory (each loaded on their first upload)
+    IMAGE_DEDUP_MAX_USERS: int = int(os.getenv("IMAGE_DEDUP_MAX_USERS", "1000"))
+    
+    # Latency budget for one analysis and the slice each stage may use of it.
+    # A stage that runs out degrades to its fallback instead of stalling the request.
+    ANALYSIS_DEADLINE_SECONDS: float = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "30"))
+    UPLOAD_TIMEOUT_SECONDS: float = float(os.getenv("UPLOAD_TIMEOUT_SECONDS", "8"))
+    VISION_TIMEOUT_SECONDS: float = float(os.getenv("VISION_TIMEOUT_SECONDS", "12"))
+    REPORT_TIMEOUT_SECONDS: float = float(os.getenv("REPORT_TIMEOUT_SECONDS", "15"))
+    SEARCH_QUERY_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_QUERY_TIMEOUT_SECONDS", "8"))
+    ALTERNATIVES_TIMEOUT_SECONDS: float = float(os.getenv("ALTERNATIVES_TIMEOUT_SECONDS", "8"))
+    
+    # Per-call timeouts and hedging (a backup call after this many seconds; 0 disables)
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+    LLM_HEDGE_AFTER_SECONDS: float = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "6"))
+    SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "5"))
+    # Off by default: Custom Search bills every query, backups included
+    SEARCH_HEDGE_AFTER_SECONDS: float = float(os.getenv("SEARCH_HEDGE_AFTER_SECONDS", "0"))
+    DYNAMODB_HEDGE_AFTER_SECONDS: float = float(os.getenv("DYNAMODB_HEDGE_AFTER_SECONDS", "0.3"))
+    AWS_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("AWS_CONNECT_TIMEOUT_SECONDS", "2"))
+    AWS_READ_TIMEOUT_SECONDS: float = float(os.getenv("AWS_READ_TIMEOUT_SECONDS", "5"))
+    
+    # Circuit breakers: open after this many consecutive failures, retry after the reset period
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS: float = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+    
+    # Google sign-in. Signing certs are cached per their Cache-Control max-age and
+    # refreshed this long before they expire; verified ID tokens are cached until exp.
+    GOOGLE_CLIENT_ID: Optional[str] = os.getenv("GOOGLE_CLIENT_ID")
+    GOOGLE_CERTS_REFRESH_MARGIN_SECONDS: float = float(os.getenv("GOOGLE_CERTS_REFRESH_MARGIN_SECONDS", "300"))
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "4096"))
+    
+    # First-party session tokens minted by /auth/google (HMAC-SHA256 with SESSION_SECRET)
+    SESSION_SECRET: Optional[str] = os.getenv("SESSION_SECRET")
+    SESSION_TOKEN_TTL_SECONDS: int = int(os.getenv("SESSION_TOKEN_TTL_SECONDS", "3600"))
+    
+    # Sign-ins whose profile is unchanged only buffer last_login/login_count, written this often
+    LOGIN_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("LOGIN_FLUSH_INTERVAL_SECONDS", "60"))
+    
+    # Required as X-Admin-Key on /admin endpoints; admin endpoints are disabled when unset
+    ADMIN_API_KEY: Optional[str] = os.getenv("ADMIN_API_KEY")
 
 settings = Settings()
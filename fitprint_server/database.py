@@ -1,33 +1,95 @@
+import asyncio
 import boto3
-from botocore.exceptions import ClientError
-from typing import Dict, Any, List, Optional
+import functools
+import threading
+import time
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
 from config import settings
+from services.resilience import CircuitOpenError, circuit_breaker, hedged, is_aws_outage
 import json
+import re
 from decimal import Decimal
 
+# Global secondary indexes (created by migrations.py)
+USER_CLOTHING_INDEX = "user_id-created_at-index"  # clothing table: user_id / created_at
+CLOTHING_REPORTS_INDEX = "clothing_id-created_at-index"  # sustainability table: clothing_id / created_at
+
+# An attribute name, or a dotted path into a map (e.g. regional_alerts.asia)
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def projection_kwargs(fields: Optional[List[str]]) -> Dict[str, Any]:
+    """ProjectionExpression arguments returning only ``fields`` (every attribute when empty)
+
+    Names go through ExpressionAttributeNames placeholders, so reserved words
+    like ``name`` work. Raises ValueError for anything that isn't a plain path.
+    """
+    if not fields:
+        return {}
+    names: Dict[str, str] = {}
+    paths = []
+    for field in fields:
+        if not FIELD_PATTERN.match(field):
+            raise ValueError(f"Invalid field name: {field!r}")
+        segments = []
+        for segment in field.split("."):
+            placeholder = f"#p{len(names)}"
+            names.setdefault(placeholder, segment)
+            segments.append(placeholder)
+        paths.append(".".join(segments))
+    return {"ProjectionExpression": ", ".join(paths), "ExpressionAttributeNames": names}
+
 class DynamoDBService:
-    def __init__(self):
-        # Initialize DynamoDB client
+    # Idempotent operations, safe to hedge
+    READ_OPERATIONS = {'get_item', 'query', 'scan', 'batch_get_item'}
+
+    def __init__(self, pool_size: int = settings.DYNAMODB_POOL_SIZE):
+        # Initialize DynamoDB client settings
         dynamodb_kwargs = {
-            'region_name': settings.AWS_REGION
+            'region_name': settings.AWS_REGION,
+            # Each pool thread owns one client, so one keep-alive connection per thread.
+            # Fail slow calls quickly and leave retries to the SDK's standard mode.
+            'config': Config(
+                max_pool_connections=1,
+                connect_timeout=settings.AWS_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=settings.AWS_READ_TIMEOUT_SECONDS,
+                retries={'max_attempts': 3, 'mode': 'standard'}
+            )
         }
-        
+
         # Add credentials if provided
         if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
             dynamodb_kwargs.update({
                 'aws_access_key_id': settings.AWS_ACCESS_KEY_ID,
                 'aws_secret_access_key': settings.AWS_SECRET_ACCESS_KEY
             })
-        
+
         # Add endpoint URL for local development
         if settings.DYNAMODB_ENDPOINT_URL:
             dynamodb_kwargs['endpoint_url'] = settings.DYNAMODB_ENDPOINT_URL
-            
-        self.dynamodb = boto3.resource('dynamodb', **dynamodb_kwargs)
-        self.clothing_table = self.dynamodb.Table(settings.DYNAMODB_TABLE_NAME)
-        self.sustainability_table = self.dynamodb.Table('sustainability-reports')
-        self.alternatives_table = self.dynamodb.Table('alternatives')
-    
+
+        self.dynamodb_kwargs = dynamodb_kwargs
+        self.table_names = {
+            "clothing": settings.DYNAMODB_TABLE_NAME,
+            "sustainability": 'sustainability-reports',
+            "alternatives": 'alternatives',
+            "cache": settings.CACHE_TABLE_NAME,
+            "jobs": settings.ANALYSIS_JOBS_TABLE_NAME,
+            "aggregates": settings.AGGREGATES_TABLE_NAME
+        }
+        if settings.USERS_TABLE_NAME:
+            self.table_names["users"] = settings.USERS_TABLE_NAME
+
+        # boto3 calls block, so they run on a dedicated, explicitly sized pool.
+        # Sessions and resources aren't thread safe, so each thread builds its own.
+        self.pool_size = pool_size
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="dynamodb")
+        self._local = threading.local()
+        self.breaker = circuit_breaker("dynamodb", is_failure=is_aws_outage)
+
     def _convert_floats_to_decimal(self, obj):
         """Convert float values to Decimal for DynamoDB compatibility"""
         if isinstance(obj, float):
@@ -38,123 +100,231 @@ class DynamoDBService:
             return [self._convert_floats_to_decimal(item) for item in obj]
         else:
             return obj
-    
+
+    def _get_resource(self):
+        """Return this thread's DynamoDB resource (call from a pool thread only)"""
+        resource = getattr(self._local, 'resource', None)
+        if resource is None:
+            session = boto3.session.Session()
+            resource = self._local.resource = session.resource('dynamodb', **self.dynamodb_kwargs)
+            self._local.tables = {}
+        return resource
+
+    def _get_table(self, table_name: str):
+        """Return this thread's Table handle (call from a pool thread only)"""
+        resource = self._get_resource()
+        tables = self._local.tables
+        if table_name not in tables:
+            tables[table_name] = resource.Table(self.table_names[table_name])
+        return tables[table_name]
+
+    async def run_in_pool(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the DynamoDB thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def call_table(self, table_name: str, operation: str, **kwargs) -> Dict[str, Any]:
+        """Run a boto3 Table operation (put_item, query, ...) without blocking the event loop
+
+        Calls go through the DynamoDB circuit breaker (raising CircuitOpenError
+        while it's open), and reads are hedged: a slow read gets a backup
+        request after DYNAMODB_HEDGE_AFTER_SECONDS.
+        """
+        if table_name not in self.table_names:
+            raise ValueError(f"Unknown table: {table_name}")
+
+        def call():
+            return getattr(self._get_table(table_name), operation)(**kwargs)
+
+        async def attempt():
+            return await self.breaker.call(lambda: self.run_in_pool(call))
+
+        if operation in self.READ_OPERATIONS:
+            return await hedged(attempt, settings.DYNAMODB_HEDGE_AFTER_SECONDS, name="dynamodb",
+                                should_retry=is_aws_outage)
+        return await attempt()
+
     async def create_item(self, item: Dict[str, Any], table_name: str = "clothing") -> Dict[str, Any]:
         """Create a new item in DynamoDB"""
+        if table_name not in self.table_names:
+            return {"success": False, "error": f"Unknown table: {table_name}"}
         try:
-            if table_name == "clothing":
-                table = self.clothing_table
-            elif table_name == "sustainability":
-                table = self.sustainability_table
-            elif table_name == "alternatives":
-                table = self.alternatives_table
-            else:
-                return {"success": False, "error": f"Unknown table: {table_name}"}
-            
             # Convert floats to Decimal for DynamoDB compatibility
             converted_item = self._convert_floats_to_decimal(item)
-            response = table.put_item(Item=converted_item)
+            response = await self.call_table(table_name, 'put_item', Item=converted_item)
             return {"success": True, "item": item, "response": response}
-        except ClientError as e:
+        except (ClientError, BotoCoreError, CircuitOpenError) as e:
+            return {"success": False, "error": str(e)}
+
+    async def batch_write_items(self, items_by_table: Dict[str, List[Dict[str, Any]]],
+                                max_retries: int = 5) -> Dict[str, Any]:
+        """Put items across several tables with as few BatchWriteItem calls as possible
+
+        DynamoDB accepts up to 25 puts per call, so a whole analysis (clothing
+        item, report and alternatives) goes out in a single round-trip.
+        UnprocessedItems are retried with exponential backoff.
+        """
+        for table_name in items_by_table:
+            if table_name not in self.table_names:
+                return {"success": False, "error": f"Unknown table: {table_name}"}
+
+        put_requests = [
+            (self.table_names[table_name], {"PutRequest": {"Item": self._convert_floats_to_decimal(item)}})
+            for table_name, items in items_by_table.items()
+            for item in items
+        ]
+
+        def write() -> int:
+            resource = self._get_resource()
+            for start in range(0, len(put_requests), 25):
+                request_items: Dict[str, List[Dict[str, Any]]] = {}
+                for physical_name, put_request in put_requests[start:start + 25]:
+                    request_items.setdefault(physical_name, []).append(put_request)
+
+                attempt = 0
+                while request_items:
+                    response = resource.batch_write_item(RequestItems=request_items)
+                    request_items = response.get('UnprocessedItems') or {}
+                    if request_items:
+                        attempt += 1
+                        if attempt > max_retries:
+                            return sum(len(requests) for requests in request_items.values())
+                        time.sleep(min(0.05 * (2 ** attempt), 1.0))
+            return 0
+
+        try:
+            unprocessed = await self.breaker.call(lambda: self.run_in_pool(write))
+        except (ClientError, BotoCoreError, CircuitOpenError) as e:
             return {"success": False, "error": str(e)}
-    
+        if unprocessed:
+            return {"success": False, "error": f"{unprocessed} items left unprocessed after {max_retries} retries"}
+        return {"success": True, "count": len(put_requests)}
+
     async def get_item(self, key: Dict[str, Any], table_name: str = "clothing") -> Dict[str, Any]:
         """Get an item by its key"""
+        if table_name not in self.table_names:
+            return {"success": False, "error": f"Unknown table: {table_name}"}
         try:
-            if table_name == "clothing":
-                table = self.clothing_table
-            elif table_name == "sustainability":
-                table = self.sustainability_table
-            elif table_name == "alternatives":
-                table = self.alternatives_table
-            else:
-                return {"success": False, "error": f"Unknown table: {table_name}"}
-            
-            response = table.get_item(Key=key)
+            response = await self.call_table(table_name, 'get_item', Key=key)
             if 'Item' in response:
                 return {"success": True, "item": response['Item']}
             else:
                 return {"success": False, "error": "Item not found"}
-        except ClientError as e:
+        except (ClientError, BotoCoreError, CircuitOpenError) as e:
             return {"success": False, "error": str(e)}
-    
-    async def update_item(self, key: Dict[str, Any], update_expression: str, 
+
+    async def update_item(self, key: Dict[str, Any], update_expression: str,
                          expression_attribute_values: Dict[str, Any], table_name: str = "clothing") -> Dict[str, Any]:
         """Update an item in DynamoDB"""
+        if table_name not in self.table_names:
+            return {"success": False, "error": f"Unknown table: {table_name}"}
         try:
-            if table_name == "clothing":
-                table = self.clothing_table
-            elif table_name == "sustainability":
-                table = self.sustainability_table
-            elif table_name == "alternatives":
-                table = self.alternatives_table
-            else:
-                return {"success": False, "error": f"Unknown table: {table_name}"}
-            
-            response = table.update_item(
+            response = await self.call_table(
+                table_name,
+                'update_item',
                 Key=key,
                 UpdateExpression=update_expression,
                 ExpressionAttributeValues=expression_attribute_values,
                 ReturnValues="UPDATED_NEW"
             )
             return {"success": True, "response": response}
-        except ClientError as e:
+        except (ClientError, BotoCoreError, CircuitOpenError) as e:
             return {"success": False, "error": str(e)}
-    
-    async def delete_item(self, key: Dict[str, Any], table_name: str = "clothing") -> Dict[str, Any]:
-        """Delete an item from DynamoDB"""
+
+    async def delete_item(self, key: Dict[str, Any], table_name: str = "clothing",
+                          return_old: bool = False) -> Dict[str, Any]:
+        """Delete an item from DynamoDB (``return_old`` adds the deleted item as ``item``, None if absent)"""
+        if table_name not in self.table_names:
+            return {"success": False, "error": f"Unknown table: {table_name}"}
         try:
-            if table_name == "clothing":
-                table = self.clothing_table
-            elif table_name == "sustainability":
-                table = self.sustainability_table
-            elif table_name == "alternatives":
-                table = self.alternatives_table
-            else:
-                return {"success": False, "error": f"Unknown table: {table_name}"}
-            
-            response = table.delete_item(Key=key)
+            if return_old:
+                response = await self.call_table(table_name, 'delete_item', Key=key, ReturnValues='ALL_OLD')
+                return {"success": True, "response": response, "item": response.get('Attributes')}
+            response = await self.call_table(table_name, 'delete_item', Key=key)
             return {"success": True, "response": response}
-        except ClientError as e:
+        except (ClientError, BotoCoreError, CircuitOpenError) as e:
             return {"success": False, "error": str(e)}
-    
-    async def scan_table(self, limit: int = 100, table_name: str = "clothing") -> Dict[str, Any]:
-        """Scan all items in the table"""
+
+    async def scan_table(self, limit: int = 100, table_name: str = "clothing",
+                         exclusive_start_key: Optional[Dict[str, Any]] = None,
+                         fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Scan one page of the table
+
+        ``fields`` limits the attributes returned. ``last_evaluated_key``
+        (None on the last page) is passed back as ``exclusive_start_key``
+        to continue.
+        """
+        if table_name not in self.table_names:
+            return {"success": False, "error": f"Unknown table: {table_name}"}
         try:
-            if table_name == "clothing":
-                table = self.clothing_table
-            elif table_name == "sustainability":
-                table = self.sustainability_table
-            elif table_name == "alternatives":
-                table = self.alternatives_table
-            else:
-                return {"success": False, "error": f"Unknown table: {table_name}"}
-            
-            response = table.scan(Limit=limit)
-            return {"success": True, "items": response.get('Items', [])}
-        except ClientError as e:
+            scan_kwargs = {'Limit': limit, **projection_kwargs(fields)}
+            if exclusive_start_key:
+                scan_kwargs['ExclusiveStartKey'] = exclusive_start_key
+            response = await self.call_table(table_name, 'scan', **scan_kwargs)
+            return {
+                "success": True,
+                "items": response.get('Items', []),
+                "last_evaluated_key": response.get('LastEvaluatedKey')
+            }
+        except (ClientError, CircuitOpenError, ValueError) as e:
             return {"success": False, "error": str(e)}
-    
-    async def query_items(self, key_condition_expression: str, 
-                         expression_attribute_values: Dict[str, Any], table_name: str = "clothing") -> Dict[str, Any]:
-        """Query items with a key condition"""
+
+    async def query_items(self, key_condition_expression: str,
+                         expression_attribute_values: Dict[str, Any], table_name: str = "clothing",
+                         index_name: Optional[str] = None, limit: Optional[int] = None,
+                         exclusive_start_key: Optional[Dict[str, Any]] = None,
+                         scan_index_forward: bool = True,
+                         fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Query items with a key condition, optionally on a secondary index
+
+        Returns one page of items (only ``fields``, if given);
+        ``last_evaluated_key`` (None on the last page) is passed back as
+        ``exclusive_start_key`` to get the next one.
+        """
+        if table_name not in self.table_names:
+            return {"success": False, "error": f"Unknown table: {table_name}"}
         try:
-            if table_name == "clothing":
-                table = self.clothing_table
-            elif table_name == "sustainability":
-                table = self.sustainability_table
-            elif table_name == "alternatives":
-                table = self.alternatives_table
-            else:
-                return {"success": False, "error": f"Unknown table: {table_name}"}
-            
-            response = table.query(
-                KeyConditionExpression=key_condition_expression,
-                ExpressionAttributeValues=expression_attribute_values
-            )
-            return {"success": True, "items": response.get('Items', [])}
-        except ClientError as e:
+            projection = projection_kwargs(fields)
+        except ValueError as e:
             return {"success": False, "error": str(e)}
+        query_kwargs = {
+            'KeyConditionExpression': key_condition_expression,
+            'ExpressionAttributeValues': expression_attribute_values,
+            'ScanIndexForward': scan_index_forward,
+            **projection
+        }
+        if index_name:
+            query_kwargs['IndexName'] = index_name
+        if limit:
+            query_kwargs['Limit'] = limit
+        if exclusive_start_key:
+            query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+        try:
+            response = await self.call_table(table_name, 'query', **query_kwargs)
+            return {
+                "success": True,
+                "items": response.get('Items', []),
+                "last_evaluated_key": response.get('LastEvaluatedKey')
+            }
+        except (ClientError, BotoCoreError, CircuitOpenError) as e:
+            return {"success": False, "error": str(e)}
+
+    async def query_all(self, key_condition_expression: str, expression_attribute_values: Dict[str, Any],
+                        table_name: str = "clothing", index_name: Optional[str] = None,
+                        fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Query every page for a key condition (for small result sets, e.g. one item's reports)"""
+        items: List[Dict[str, Any]] = []
+        start_key = None
+        while True:
+            result = await self.query_items(key_condition_expression, expression_attribute_values,
+                                            table_name=table_name, index_name=index_name,
+                                            exclusive_start_key=start_key, fields=fields)
+            if not result["success"]:
+                return result
+            items.extend(result["items"])
+            start_key = result["last_evaluated_key"]
+            if not start_key:
+                return {"success": True, "items": items}
 
 # Create a global instance
 dynamodb_service = DynamoDBService()
@@ -2,35 +2,40 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 from datetime import datetime, timezone
 from typing import Any, Dict
 
-import boto3
-from botocore.exceptions import ClientError
-from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Header, HTTPException, status
+from botocore.exceptions import BotoCoreError, ClientError
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
 from pydantic import BaseModel
 
 from api.models import ItemCreate, ItemUpdate
+from api.pagination import decode_cursor, encode_cursor, parse_fields
 from api.routes.clothing_routes import router as clothing_router
 from api.routes.sustainability_routes import router as sustainability_router
 from api.routes.analysis_routes import router as analysis_router
+from api.routes.admin_routes import router as admin_router
 from config import settings
 from database import dynamodb_service
+from services.analysis_jobs import analysis_job_runner
+from services.google_auth import google_token_verifier
+from services.google_search_service import google_search_service
+from services.login_activity import login_activity, profile_digest
+from services.session_tokens import InvalidSessionToken, session_tokens
+from services.metrics import metrics
+from services.resilience import CircuitOpenError
 
-
-load_dotenv(override=True)
+# .env is loaded once, by config
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-USERS_TABLE_NAME = os.getenv("USERS_TABLE_NAME")
+GOOGLE_CLIENT_ID = settings.GOOGLE_CLIENT_ID
+USERS_TABLE_NAME = settings.USERS_TABLE_NAME
 
 logger.info("Using Google client ID audience %s", GOOGLE_CLIENT_ID)
 
@@ -54,6 +59,7 @@ app.add_middleware(
 app.include_router(clothing_router)
 app.include_router(sustainability_router)
 app.include_router(analysis_router)
+app.include_router(admin_router)
 
 @app.get("/")
 async def root() -> Dict[str, str]:
@@ -116,31 +122,24 @@ async def delete_item(clothing_id: str, brand: str | None = None) -> Dict[str, s
 
 
 @app.get("/items")
-async def list_items(limit: int = 100) -> Dict[str, Any]:
-    """List items in the table."""
+async def list_items(limit: int = Query(100, ge=1, le=1000), cursor: str | None = None,
+                     fields: str | None = None) -> Dict[str, Any]:
+    """List items in the table, one page at a time (see /clothing/ for cursor and fields)."""
 
-    result = await dynamodb_service.scan_table(limit)
+    result = await dynamodb_service.scan_table(limit, exclusive_start_key=decode_cursor(cursor),
+                                               fields=parse_fields(fields))
     if result["success"]:
-        return result
+        return {
+            "success": True,
+            "items": result["items"],
+            "next_cursor": encode_cursor(result["last_evaluated_key"]),
+        }
     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=result["error"])
 
 
 # Google sign-in support -------------------------------------------------------
 
-dynamodb_kwargs: Dict[str, Any] = {"region_name": settings.AWS_REGION}
-if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
-    dynamodb_kwargs.update(
-        {
-            "aws_access_key_id": settings.AWS_ACCESS_KEY_ID,
-            "aws_secret_access_key": settings.AWS_SECRET_ACCESS_KEY,
-        }
-    )
-if settings.DYNAMODB_ENDPOINT_URL:
-    dynamodb_kwargs["endpoint_url"] = settings.DYNAMODB_ENDPOINT_URL
-
-dynamodb_resource = boto3.resource("dynamodb", **dynamodb_kwargs)
-users_table = dynamodb_resource.Table(USERS_TABLE_NAME)
-google_request = google_requests.Request()
+# The users table is served by the shared DynamoDB thread pool (see database.py)
 
 
 class GoogleLoginRequest(BaseModel):
@@ -157,22 +156,39 @@ class AuthenticatedUser(BaseModel):
     full_name: str | None = None
     picture: str | None = None
     last_login: datetime
+    session_token: str | None = None
+    session_expires_at: datetime | None = None
 
 
-def verify_google_id_token(token: str) -> Dict[str, Any]:
+async def verify_google_id_token(token: str) -> Dict[str, Any]:
     """Validate the Google ID token and return its claims."""
 
     try:
-        return id_token.verify_oauth2_token(token, google_request, GOOGLE_CLIENT_ID)
+        return await google_token_verifier.verify(token)
     except ValueError as exc:  # token invalid/expired/mismatched audience
         logger.warning("Invalid Google ID token: %s", exc)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Google ID token")
 
 
-def upsert_user(claims: Dict[str, Any]) -> Dict[str, Any]:
-    """Persist the Google user in DynamoDB and return the stored item."""
+async def upsert_user(claims: Dict[str, Any]) -> Dict[str, Any]:
+    """Persist the Google user in DynamoDB and return the stored item.
+
+    When this process already stored the same profile, only the login is
+    recorded; it is buffered and written in the next periodic flush.
+    """
 
     now = datetime.now(timezone.utc).isoformat()
+    digest = profile_digest(claims)
+    if login_activity.profile_is_stored(claims["sub"], digest):
+        login_activity.record_login(claims["sub"], now)
+        return {
+            "user_id": claims["sub"],
+            "email": claims.get("email"),
+            "full_name": claims.get("name"),
+            "picture": claims.get("picture"),
+            "last_login": now,
+        }
+
     item_key = {"user_id": claims["sub"]}
     update_expression = (
         "SET email = :email, full_name = :full_name, picture = :picture, "
@@ -186,37 +202,58 @@ def upsert_user(claims: Dict[str, Any]) -> Dict[str, Any]:
         ":provider": "google",
         ":last_login": now,
         ":created_at": now,
-        ":inc": 1,
     }
+    # Buffered logins ride along with this write, and go back in the buffer if it fails
+    pending = login_activity.take_pending(claims["sub"])
+    expression_values[":inc"] = 1 + (pending["count"] if pending else 0)
 
     try:
-        response = users_table.update_item(
+        response = await dynamodb_service.call_table(
+            "users",
+            "update_item",
             Key=item_key,
             UpdateExpression=update_expression + " ADD login_count :inc",
             ExpressionAttributeValues=expression_values,
             ReturnValues="ALL_NEW",
         )
-    except ClientError as exc:  # DynamoDB unavailable/misconfigured
+    except (ClientError, BotoCoreError, CircuitOpenError) as exc:  # DynamoDB unavailable/misconfigured
+        login_activity.restore_pending(claims["sub"], pending)
         logger.exception("Failed to upsert user in DynamoDB")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to store user profile") from exc
 
     attributes = response.get("Attributes") or {}
+    login_activity.mark_profile_stored(claims["sub"], digest)
     logger.info("Upserted user %s", attributes.get("user_id"))
     return attributes
 
 
-def fetch_user(user_id: str) -> Dict[str, Any] | None:
+async def fetch_user(user_id: str) -> Dict[str, Any] | None:
     """Retrieve a previously stored user record."""
 
     try:
-        response = users_table.get_item(Key={"user_id": user_id})
-    except ClientError as exc:
+        response = await dynamodb_service.call_table("users", "get_item", Key={"user_id": user_id})
+    except (ClientError, BotoCoreError, CircuitOpenError) as exc:
         logger.exception("Failed to fetch user from DynamoDB")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load user profile") from exc
 
     return response.get("Item")
 
 
+def start_session(stored_user: Dict[str, Any]) -> AuthenticatedUser:
+    """Build the sign-in response, including a fresh session token for later requests."""
+
+    session = session_tokens.issue(stored_user)
+    return AuthenticatedUser(
+        user_id=stored_user["user_id"],
+        email=stored_user.get("email"),
+        full_name=stored_user.get("full_name"),
+        picture=stored_user.get("picture"),
+        last_login=datetime.fromisoformat(stored_user["last_login"]),
+        session_token=session["token"],
+        session_expires_at=datetime.fromtimestamp(session["expires_at"], timezone.utc),
+    )
+
+
 def get_bearer_token(authorization: str = Header(default="")) -> str:
     """Extract the bearer token from the Authorization header."""
 
@@ -237,6 +274,41 @@ def get_bearer_token(authorization: str = Header(default="")) -> str:
 #         raise RuntimeError("Unable to access USERS_TABLE_NAME in DynamoDB. Double-check the table name and AWS IAM permissions.") from exc
 
 
+@app.on_event("startup")
+async def warm_google_certs() -> None:
+    """Fetch Google's signing certs in the background so the first sign-in doesn't wait."""
+
+    async def warm() -> None:
+        try:
+            await google_token_verifier.get_certs()
+        except Exception as exc:
+            # Offline starts are fine; the first sign-in fetches them instead
+            logger.warning(f"Failed to prefetch Google signing certs: {exc}")
+
+    app.state.certs_warmup = asyncio.create_task(warm())
+
+
+@app.on_event("shutdown")
+async def stop_analysis_workers() -> None:
+    """Stop background analysis workers, failing jobs that can no longer run."""
+
+    await analysis_job_runner.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_search_client() -> None:
+    """Close pooled Custom Search connections."""
+
+    await google_search_service.client.aclose()
+
+
+@app.on_event("shutdown")
+async def flush_login_activity() -> None:
+    """Write sign-ins still buffered in memory."""
+
+    await login_activity.shutdown()
+
+
 @app.get("/health", tags=["system"])
 async def healthcheck() -> Dict[str, str]:
     """Basic liveness probe for monitoring."""
@@ -244,33 +316,40 @@ async def healthcheck() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["system"])
+async def get_metrics() -> Dict[str, Any]:
+    """Process-local counters and gauges (LLM queue depth, latencies, ...)."""
+
+    return metrics.snapshot()
+
+
 @app.post("/auth/google", response_model=AuthenticatedUser, tags=["auth"], summary="Sign in with Google")
 async def authenticate_with_google(payload: GoogleLoginRequest) -> AuthenticatedUser:
     """Validate the Google ID token and persist the user profile."""
 
-    claims = verify_google_id_token(payload.id_token)
-    stored_user = upsert_user(claims)
+    claims = await verify_google_id_token(payload.id_token)
+    stored_user = await upsert_user(claims)
 
-    return AuthenticatedUser(
-        user_id=stored_user["user_id"],
-        email=stored_user.get("email"),
-        full_name=stored_user.get("full_name"),
-        picture=stored_user.get("picture"),
-        last_login=datetime.fromisoformat(stored_user["last_login"]),
-    )
+    return start_session(stored_user)
 
 
 @app.get("/auth/me", response_model=AuthenticatedUser, tags=["auth"], summary="Return the current user")
 async def get_authenticated_user(token: str = Depends(get_bearer_token)) -> AuthenticatedUser:
-    """Return the current user based on an existing Google ID token."""
+    """Return the current user from a session token, or from a Google ID token (which starts a session)."""
 
-    claims = verify_google_id_token(token)
-    stored_user = fetch_user(claims["sub"]) or upsert_user(claims)
+    try:
+        session = session_tokens.verify(token)
+    except InvalidSessionToken:
+        claims = await verify_google_id_token(token)
+        stored_user = await fetch_user(claims["sub"]) or await upsert_user(claims)
+        return start_session(stored_user)
 
+    # Everything needed is in the signed token: no Google or DynamoDB call
     return AuthenticatedUser(
-        user_id=stored_user["user_id"],
-        email=stored_user.get("email"),
-        full_name=stored_user.get("full_name"),
-        picture=stored_user.get("picture"),
-        last_login=datetime.fromisoformat(stored_user["last_login"]),
+        user_id=session["sub"],
+        email=session.get("email"),
+        full_name=session.get("full_name"),
+        picture=session.get("picture"),
+        last_login=datetime.fromisoformat(session["last_login"]),
+        session_expires_at=datetime.fromtimestamp(session["exp"], timezone.utc),
     )
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Create the DynamoDB secondary indexes the API queries.
+
+Usage: python migrations.py [--dry-run] [--no-wait]
+
+Safe to run repeatedly: indexes that already exist are skipped. DynamoDB
+builds one new GSI per UpdateTable call, so each index is created and (unless
+--no-wait) waited on until ACTIVE before the next one starts. Uses the same
+AWS settings as the API (see config.py).
+"""
+import argparse
+import sys
+import time
+from typing import Any, Dict, List
+
+import boto3
+
+from database import CLOTHING_REPORTS_INDEX, USER_CLOTHING_INDEX, dynamodb_service
+
+# Logical table name -> GSIs it needs: (index name, partition key, sort key)
+INDEXES = {
+    "clothing": [(USER_CLOTHING_INDEX, "user_id", "created_at")],
+    "sustainability": [(CLOTHING_REPORTS_INDEX, "clothing_id", "created_at")],
+}
+
+# Only used for tables in provisioned-capacity mode
+DEFAULT_INDEX_THROUGHPUT = {"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
+
+
+def index_update(description: Dict[str, Any], index_name: str, partition_key: str, sort_key: str) -> Dict[str, Any]:
+    """UpdateTable arguments that add one GSI to the described table"""
+    create = {
+        "IndexName": index_name,
+        "KeySchema": [
+            {"AttributeName": partition_key, "KeyType": "HASH"},
+            {"AttributeName": sort_key, "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+    if description.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        create["ProvisionedThroughput"] = DEFAULT_INDEX_THROUGHPUT
+    return {
+        "TableName": description["TableName"],
+        "AttributeDefinitions": [
+            {"AttributeName": partition_key, "AttributeType": "S"},
+            {"AttributeName": sort_key, "AttributeType": "S"},
+        ],
+        "GlobalSecondaryIndexUpdates": [{"Create": create}],
+    }
+
+
+def wait_until_active(client, table_name: str, index_name: str, poll_seconds: float = 10) -> None:
+    while True:
+        description = client.describe_table(TableName=table_name)["Table"]
+        statuses = {index["IndexName"]: index["IndexStatus"] for index in description.get("GlobalSecondaryIndexes", [])}
+        if statuses.get(index_name) == "ACTIVE" and description["TableStatus"] == "ACTIVE":
+            return
+        print(f"  ⏳ {table_name}.{index_name}: {statuses.get(index_name, 'PENDING')}")
+        time.sleep(poll_seconds)
+
+
+def migrate(client, dry_run: bool = False, wait: bool = True) -> List[str]:
+    """Create missing indexes; returns the ones created (or that would be)"""
+    created = []
+    for logical_name, indexes in INDEXES.items():
+        table_name = dynamodb_service.table_names[logical_name]
+        description = client.describe_table(TableName=table_name)["Table"]
+        existing = {index["IndexName"] for index in description.get("GlobalSecondaryIndexes", [])}
+        for index_name, partition_key, sort_key in indexes:
+            if index_name in existing:
+                print(f"✅ {table_name}.{index_name} already exists")
+                continue
+            print(f"➕ {'Would create' if dry_run else 'Creating'} {table_name}.{index_name} ({partition_key}, {sort_key})")
+            created.append(f"{table_name}.{index_name}")
+            if dry_run:
+                continue
+            client.update_table(**index_update(description, index_name, partition_key, sort_key))
+            if wait:
+                wait_until_active(client, table_name, index_name)
+            description = client.describe_table(TableName=table_name)["Table"]
+    return created
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be created")
+    parser.add_argument("--no-wait", action="store_true", help="Don't wait for new indexes to become ACTIVE")
+    args = parser.parse_args()
+
+    client = boto3.client("dynamodb", **dynamodb_service.dynamodb_kwargs)
+    created = migrate(client, dry_run=args.dry_run, wait=not args.no_wait)
+    print(f"🎉 {len(created)} index(es) {'to create' if args.dry_run else 'created'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
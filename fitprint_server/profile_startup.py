@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the API's startup, with the network switched off.
+
+Usage: python profile_startup.py [--module main] [--top 25]
+
+Imports the module in a fresh interpreter under ``python -X importtime``
+with socket connects and DNS lookups replaced by a guard that records and
+refuses them, then prints the slowest imports by cumulative time, the total,
+and any network access attempted at import. Startup must not need the
+network: service clients (Gemini, S3, search, Google certs) are built on
+first use, not at import.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Runs in the child before the import under test
+GUARD = """
+import socket, sys
+def _refuse(what):
+    def guard(*args, **kwargs):
+        sys.stderr.write(f"network-attempt: {what} {args[1:] if what == 'connect' else args[:2]}\\n")
+        raise OSError(f"network access during import ({what})")
+    return guard
+socket.socket.connect = _refuse("connect")
+socket.socket.connect_ex = _refuse("connect")
+socket.getaddrinfo = _refuse("getaddrinfo")
+socket.create_connection = _refuse("create_connection")
+import {module}
+"""
+
+
+def parse_importtime(stderr: str):
+    """(module, self_us, cumulative_us) rows from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--top", type=int, default=25, help="How many imports to list")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", GUARD.replace("{module}", args.module)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    rows = parse_importtime(result.stderr)
+    attempts = [line for line in result.stderr.splitlines() if line.startswith("network-attempt:")]
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+    top_level = next((row for row in rows if row[0].strip() == args.module), None)
+    if top_level:
+        print(f"\n⏱️  import {args.module}: {top_level[2] / 1000:.0f}ms ({wall_ms:.0f}ms including interpreter start)")
+
+    if attempts:
+        print(f"\n❌ {len(attempts)} network attempt(s) during import:")
+        for attempt in attempts:
+            print(f"  {attempt[len('network-attempt:'):].strip()}")
+    else:
+        print("\n✅ No network access during import")
+
+    if result.returncode != 0:
+        print(f"\n❌ import {args.module} failed:")
+        print("\n".join(line for line in result.stderr.splitlines()
+                        if not line.startswith(("import time:", "network-attempt:")))[-2000:])
+        return 1
+    return 1 if attempts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
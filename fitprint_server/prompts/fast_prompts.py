@@ -79,3 +79,86 @@ Return ONLY this JSON array format:
     }}
 ]
 """
+
+BRAND_IDENTIFICATION_PROMPT = """
+Look at this clothing item image and identify:
+1. The brand name - look for ANY visible logos, tags, labels, or distinctive design elements
+2. If you can't see a clear brand, make your BEST GUESS based on the style, quality, and design
+3. NEVER say "Unknown" - always provide a specific brand name guess
+4. The type of clothing item
+5. Any visible details about materials or style
+
+Common brands to consider: Nike, Adidas, H&M, Zara, Uniqlo, Gap, Old Navy, Target, Walmart, Shein, Fashion Nova, Forever 21, Urban Outfitters, American Eagle, Hollister, Abercrombie, Lululemon, Patagonia, North Face, Columbia, Champion, Puma, Reebok, Under Armour, Ralph Lauren, Tommy Hilfiger, Calvin Klein, Levi's, Wrangler, Carhartt, Dickies, etc.
+
+Return ONLY a JSON object with this structure:
+{
+    "brand": "Specific Brand Name (make your best guess, never say Unknown)",
+    "product_title": "Brief description of the item",
+    "product_description": "More detailed description including visible features",
+    "confidence": 0.0 to 1.0
+}
+"""
+
+BATCH_BRAND_IDENTIFICATION_PROMPT = """
+You will receive {count} clothing item images, each preceded by its label ("Image 1:", "Image 2:", ...).
+Treat every image independently. For each one identify:
+1. The brand name - look for ANY visible logos, tags, labels, or distinctive design elements
+2. If you can't see a clear brand, make your BEST GUESS based on the style, quality, and design
+3. NEVER say "Unknown" - always provide a specific brand name guess
+4. The type of clothing item
+5. Any visible details about materials or style
+
+Common brands to consider: Nike, Adidas, H&M, Zara, Uniqlo, Gap, Old Navy, Target, Walmart, Shein, Fashion Nova, Forever 21, Urban Outfitters, American Eagle, Hollister, Abercrombie, Lululemon, Patagonia, North Face, Columbia, Champion, Puma, Reebok, Under Armour, Ralph Lauren, Tommy Hilfiger, Calvin Klein, Levi's, Wrangler, Carhartt, Dickies, etc.
+
+Return ONLY a JSON array with exactly {count} objects, in the same order as the images:
+[
+    {{
+        "brand": "Specific Brand Name (make your best guess, never say Unknown)",
+        "product_title": "Brief description of the item",
+        "product_description": "More detailed description including visible features",
+        "confidence": 0.0 to 1.0
+    }}
+]
+"""
+
+SINGLE_SHOT_ANALYSIS_PROMPT = """
+Look at this clothing item image and do three things in one answer.
+
+1. Identify the item:
+   - The brand name - look for ANY visible logos, tags, labels, or distinctive design elements
+   - If you can't see a clear brand, make your BEST GUESS based on the style, quality, and design
+   - NEVER say "Unknown" - always provide a specific brand name guess
+   - The type of clothing item and any visible details about materials or style
+
+2. Rate the item's sustainability from what you know about the brand and what you see.
+   Scores are between 1 and 5 (decimals allowed); the descriptions must be realistic and specific to this brand and item.
+
+3. Write a Google Shopping search query that finds similar sustainable CLOTHING items for purchase.
+   Focus on the TYPE of clothing (e.g., "men's t-shirt", "women's jeans", "jacket"), add "sustainable" or "eco-friendly",
+   and include "buy" or "shop". Example: "buy sustainable organic cotton men's t-shirt"
+
+Common brands to consider: Nike, Adidas, H&M, Zara, Uniqlo, Gap, Old Navy, Target, Walmart, Shein, Fashion Nova, Forever 21, Urban Outfitters, American Eagle, Hollister, Abercrombie, Lululemon, Patagonia, North Face, Columbia, Champion, Puma, Reebok, Under Armour, Ralph Lauren, Tommy Hilfiger, Calvin Klein, Levi's, Wrangler, Carhartt, Dickies, etc.
+
+Return ONLY a JSON object with this structure:
+{
+    "brand_info": {
+        "brand": "Specific Brand Name (make your best guess, never say Unknown)",
+        "product_title": "Brief description of the item",
+        "product_description": "More detailed description including visible features",
+        "confidence": 0.0 to 1.0
+    },
+    "report": {
+        "categories": {
+            "material_origin": {"score": number, "description": "..."},
+            "production_impact": {"score": number, "description": "..."},
+            "labor_ethics": {"score": number, "description": "..."},
+            "end_of_life": {"score": number, "description": "..."},
+            "brand_transparency": {"score": number, "description": "..."}
+        },
+        "overall_score": number,
+        "overall_description": "One or two sentences summarising the item's sustainability",
+        "regional_alerts": {}
+    },
+    "search_query": "buy sustainable ..."
+}
+"""
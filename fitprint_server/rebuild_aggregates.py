@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Recompute the materialized sustainability score statistics.
+
+Usage: python rebuild_aggregates.py [--segments 8]
+
+Scans every sustainability report in parallel (DynamoDB Segment /
+TotalSegments) and overwrites the aggregate item that
+/sustainability/scores/summary reads. Run it once after creating the
+aggregates table, and whenever the counters may have drifted. The API
+exposes the same thing as POST /admin/aggregates/scores/rebuild.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from services.score_aggregates import score_aggregates
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=8, help="Parallel scan segments")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summary = await score_aggregates.rebuild(args.segments)
+    print(json.dumps(summary, indent=2, default=str))
+    print(f"🎉 Rebuilt in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
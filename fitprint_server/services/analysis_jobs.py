@@ -0,0 +1,174 @@
+"""
+Background outfit analysis jobs for POST /analysis/outfit?async=true
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from config import settings
+from database import dynamodb_service
+from services.analysis_pipeline import get_outfit_analysis_pipeline, AnalysisPipelineError
+from services.metrics import metrics
+from services.ttl_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+JOB_TTL_SECONDS = 7 * 24 * 3600
+
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+class InMemoryJobStore:
+    """Job store kept in this process; for tests and single-instance dev setups"""
+
+    def __init__(self, max_jobs: int = 10000):
+        self._jobs = LRUCache(max_jobs, JOB_TTL_SECONDS)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._jobs.set(job["analysis_id"], dict(job))
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(analysis_id)
+        return dict(job) if job is not None else None
+
+
+class DynamoDBJobStore:
+    """Durable job store shared by every replica
+
+    The result is stored as a JSON string so it round-trips without Decimal
+    conversion, and ``expires_at`` lets DynamoDB TTL clean old jobs up.
+    """
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        item = {key: value for key, value in job.items() if key != "result"}
+        if job.get("result") is not None:
+            item["result"] = json.dumps(job["result"])
+        item["expires_at"] = int(time.time() + JOB_TTL_SECONDS)
+        result = await dynamodb_service.create_item(item, table_name="jobs")
+        if not result["success"]:
+            raise RuntimeError(f"Failed to save analysis job: {result['error']}")
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        result = await dynamodb_service.get_item({"analysis_id": analysis_id}, table_name="jobs")
+        if not result["success"]:
+            return None
+        job = dict(result["item"])
+        job.pop("expires_at", None)
+        if job.get("result"):
+            job["result"] = json.loads(job["result"])
+        return job
+
+
+class AnalysisJobRunner:
+    """Bounded in-process worker pool that runs queued analyses
+
+    ``submit`` returns as soon as the job is recorded and queued; at most
+    ``workers`` analyses run at once and at most ``max_queued`` wait, beyond
+    which submissions are rejected so bursts can't exhaust memory. Queued jobs
+    live in this process, so a job still queued when the worker shuts down is
+    marked failed.
+    """
+
+    def __init__(self, store, workers: int = settings.ANALYSIS_JOB_WORKERS,
+                 max_queued: int = settings.ANALYSIS_JOB_QUEUE_SIZE):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        # Queue slots claimed by submits still saving their job
+        self._reserved = 0
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._worker_tasks = [asyncio.create_task(self._work(i)) for i in range(self.workers)]
+
+    async def submit(self, user_id: str, image_content: bytes, filename: Optional[str],
+                     single_shot: Optional[bool] = None) -> Dict[str, Any]:
+        self._ensure_started()
+        # Claim the slot before awaiting the store, so concurrent submits
+        # can't all pass the check and then overflow the queue
+        if self._queue.qsize() + self._reserved >= self.max_queued:
+            metrics.increment("analysis_jobs.rejected")
+            raise JobQueueFullError("Analysis queue is full, try again shortly")
+        self._reserved += 1
+
+        now = datetime.now().isoformat() + "Z"
+        job = {
+            "analysis_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now
+        }
+        try:
+            await self.store.save(job)
+        finally:
+            self._reserved -= 1
+        self._queue.put_nowait((job, image_content, filename, single_shot))
+        metrics.increment("analysis_jobs.submitted")
+        metrics.set_gauge("analysis_jobs.queued", self._queue.qsize())
+        return job
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(analysis_id)
+
+    async def _update(self, job: Dict[str, Any], **fields) -> None:
+        job.update(fields, updated_at=datetime.now().isoformat() + "Z")
+        try:
+            await self.store.save(job)
+        except Exception as e:
+            logger.error(f"Failed to record status of analysis job {job['analysis_id']}: {str(e)}")
+
+    async def _work(self, worker_number: int) -> None:
+        while True:
+            job, image_content, filename, single_shot = await self._queue.get()
+            metrics.set_gauge("analysis_jobs.queued", self._queue.qsize())
+            try:
+                await self._update(job, status="running")
+                response = await get_outfit_analysis_pipeline().run(
+                    job["user_id"], image_content, filename,
+                    analysis_id=job["analysis_id"],
+                    single_shot=single_shot
+                )
+                await self._update(job, status="completed", result=jsonable_encoder(response))
+                metrics.increment("analysis_jobs.completed")
+            except asyncio.CancelledError:
+                await self._update(job, status="failed", error="Worker shut down before the analysis finished")
+                raise
+            except AnalysisPipelineError as e:
+                await self._update(job, status="failed", error=e.detail)
+                metrics.increment("analysis_jobs.failed")
+            except Exception as e:
+                logger.error(f"Analysis job {job['analysis_id']} failed: {str(e)}")
+                await self._update(job, status="failed", error=f"Analysis failed: {str(e)}")
+                metrics.increment("analysis_jobs.failed")
+            finally:
+                self._queue.task_done()
+
+    async def shutdown(self) -> None:
+        """Stop the workers and fail any jobs still waiting in the queue"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()[0]
+            await self._update(job, status="failed", error="Worker shut down before the analysis started")
+
+
+def create_job_store():
+    if settings.ANALYSIS_JOB_STORE == "memory":
+        return InMemoryJobStore()
+    return DynamoDBJobStore()
+
+
+analysis_job_runner = AnalysisJobRunner(create_job_store())
@@ -0,0 +1,677 @@
+"""
+Outfit analysis pipeline built as a dependency graph of async stages
+"""
+import asyncio
+import functools
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+from api.models import (
+    OutfitAnalysisResponse,
+    ClothingResponse,
+    SustainabilityReport,
+    AlternativeProduct
+)
+from database import dynamodb_service
+from services.s3_service import get_s3_service
+from services.google_search_service import google_search_service
+from services.gemini_service import gemini_service
+from services.fast_gemini_service import fast_gemini_service, FALLBACK_BRAND_INFO
+from services.report_cache import report_cache, report_cache_key
+from services.shopping_cache import normalize_search_query, search_query_cache, shopping_results_cache
+from services.image_index import image_dedup_index
+from services.metrics import metrics
+from services.resilience import deadline, within
+from services.score_aggregates import score_aggregates
+
+logger = logging.getLogger(__name__)
+
+# Used when Google Shopping fails or every result gets filtered out
+FALLBACK_ALTERNATIVES = [
+    {
+        "name": "Organic Cotton T-Shirt",
+        "brand": "Patagonia",
+        "image_url": "",
+        "sustainability_score": 4.5,
+        "link": "https://www.patagonia.com",
+        "why_sustainable": "Made with 100% organic cotton and Fair Trade certified"
+    },
+    {
+        "name": "Recycled Polyester Hoodie",
+        "brand": "Reformation",
+        "image_url": "",
+        "sustainability_score": 4.2,
+        "link": "https://www.thereformation.com",
+        "why_sustainable": "Uses recycled polyester from plastic bottles, carbon neutral shipping"
+    },
+    {
+        "name": "Hemp Blend Jeans",
+        "brand": "Everlane",
+        "image_url": "",
+        "sustainability_score": 4.7,
+        "link": "https://www.everlane.com",
+        "why_sustainable": "Hemp requires 50% less water than cotton, biodegradable materials"
+    }
+]
+
+StageFunc = Callable[..., Awaitable[Any]]
+StageCallback = Callable[[str, Any], Awaitable[None]]
+EventCallback = Callable[[str, Any], Awaitable[None]]
+
+
+class AnalysisPipelineError(Exception):
+    """A stage failed in a way the caller should report to the client"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class StageGraph:
+    """Run async stages as soon as the stages they depend on have finished
+
+    Each stage is called with the results of its dependencies as keyword
+    arguments named after those stages, so independent branches of the graph
+    run concurrently and the total latency is the critical path.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, Tuple[StageFunc, Tuple[str, ...]]] = {}
+
+    def add_stage(self, name: str, func: StageFunc, depends_on: Iterable[str] = ()) -> "StageGraph":
+        """Register a stage; dependencies must already be registered"""
+        depends_on = tuple(depends_on)
+        for dependency in depends_on:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+        self._stages[name] = (func, depends_on)
+        return self
+
+    async def run(self, on_stage_complete: Optional[StageCallback] = None) -> Dict[str, Any]:
+        """Run every stage and return their results keyed by stage name"""
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        async def run_stage(name: str, func: StageFunc, depends_on: Tuple[str, ...]) -> Any:
+            inputs = {dependency: await tasks[dependency] for dependency in depends_on}
+            stage_started = time.perf_counter()
+            result = await func(**inputs)
+            timings[name] = (time.perf_counter() - stage_started) * 1000
+            logger.info(f"[{self.name}] stage '{name}' finished in {timings[name]:.0f} ms")
+            if on_stage_complete is not None:
+                await on_stage_complete(name, result)
+            return result
+
+        for name, (func, depends_on) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, func, depends_on))
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            # One stage failed: stop the rest instead of leaving them running detached
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            total = (time.perf_counter() - started) * 1000
+            stage_summary = ", ".join(f"{name}={ms:.0f}ms" for name, ms in timings.items())
+            logger.info(f"[{self.name}] finished in {total:.0f} ms ({stage_summary})")
+
+        return dict(zip(tasks.keys(), results))
+
+
+class OutfitAnalysisPipeline:
+    """Stages of an outfit analysis, wired together by ``run``
+
+    The upload is decoded and hashed once up front; a near-duplicate of one
+    of the user's earlier uploads short-circuits to the stored analysis.
+    Otherwise the stages run with these dependencies:
+        (processed image) -> upload, vision
+        vision -> report, search_query
+        search_query -> alternatives
+        upload, vision, report, alternatives -> persist
+    """
+
+    async def process_image(self, image_content: bytes) -> Dict[str, Any]:
+        return await get_s3_service().process_image(image_content)
+
+    async def find_duplicate(self, user_id: str, processed_image: Dict[str, Any],
+                             analysis_id: str) -> Optional[OutfitAnalysisResponse]:
+        """Return the stored analysis of a near-identical earlier upload, if any"""
+        if not settings.IMAGE_DEDUP_ENABLED or processed_image.get("image_hash") is None:
+            return None
+
+        match = await image_dedup_index.find(processed_image["image_hash"], user_id)
+        if match is None:
+            return None
+
+        stored = await self.load_analysis(match["clothing_id"], match["report_id"], analysis_id)
+        if stored is not None:
+            logger.info(f"Upload matches clothing item {match['clothing_id']} (distance {match['distance']}), reusing its analysis")
+            metrics.increment("analysis.dedup_hits")
+        return stored
+
+    async def load_analysis(self, clothing_id: str, report_id: str,
+                            analysis_id: str) -> Optional[OutfitAnalysisResponse]:
+        """Rebuild an analysis response from its stored DynamoDB items"""
+        clothing_result, report_result = await asyncio.gather(
+            dynamodb_service.get_item({"clothing_id": clothing_id}, table_name="clothing"),
+            dynamodb_service.get_item({"report_id": report_id}, table_name="sustainability")
+        )
+        if not clothing_result["success"] or not report_result["success"]:
+            return None
+
+        report_item = report_result["item"]
+        alt_results = await asyncio.gather(*[
+            dynamodb_service.get_item({"alternative_id": alternative_id}, table_name="alternatives")
+            for alternative_id in report_item.get("alternative_ids", [])
+        ])
+
+        return OutfitAnalysisResponse(
+            clothing_item=ClothingResponse(**clothing_result["item"]),
+            sustainability_report=SustainabilityReport(**report_item),
+            alternatives=[AlternativeProduct(**result["item"]) for result in alt_results if result["success"]],
+            analysis_id=analysis_id,
+            created_at=datetime.now().isoformat() + "Z"
+        )
+
+    async def within_budget(self, stage: str, awaitable: Awaitable[Any], timeout: float,
+                            fallback: Callable[[], Any]) -> Any:
+        """Await a stage's call within its slice of the request deadline
+
+        If the slice (``timeout``, or less when the deadline is closer) runs
+        out, the call is cancelled and ``fallback()`` is returned instead.
+        """
+        try:
+            return await within(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage {stage} ran out of time, using its fallback")
+            metrics.increment(f"analysis.stage_timeouts.{stage}")
+            return fallback()
+
+    async def upload_image(self, processed_image: Dict[str, Any], user_id: str, filename: Optional[str]) -> str:
+        def timed_out():
+            raise AnalysisPipelineError(504, "Image upload timed out")
+
+        upload_result = await self.within_budget("upload", get_s3_service().upload_image(
+            file_content=processed_image["content"],
+            user_id=user_id,
+            original_filename=filename,
+            content_type=processed_image["content_type"]
+        ), settings.UPLOAD_TIMEOUT_SECONDS, timed_out)
+        if not upload_result["success"]:
+            raise AnalysisPipelineError(400, f"Image upload failed: {upload_result['error']}")
+
+        logger.info(f"Image uploaded successfully: {upload_result['image_url']}")
+        return upload_result["image_url"]
+
+    def vision_image(self, processed_image: Dict[str, Any]) -> Dict[str, Any]:
+        """The (downscaled) image Gemini sees, as ``content``/``content_type``"""
+        content = processed_image.get("vision_content") or processed_image["content"]
+        metrics.observe("vision.payload_bytes", len(content))
+        return {
+            "content": content,
+            "content_type": processed_image.get("vision_content_type") or processed_image["content_type"]
+        }
+
+    async def identify_brand(self, processed_image: Dict[str, Any]) -> Dict[str, Any]:
+        image = self.vision_image(processed_image)
+        vision_result = await self.within_budget("vision", fast_gemini_service.identify_brand_from_image(
+            image["content"],
+            mime_type=image["content_type"]
+        ), settings.VISION_TIMEOUT_SECONDS, self._vision_timed_out)
+        return self._brand_info_from_vision(vision_result)
+
+    async def identify_brands(self, processed_images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Identify several images with one multi-image Gemini Vision request"""
+        vision_results = await self.within_budget("vision", fast_gemini_service.identify_brands_from_images(
+            [self.vision_image(processed_image) for processed_image in processed_images]
+        ), settings.VISION_TIMEOUT_SECONDS, lambda: [self._vision_timed_out() for _ in processed_images])
+        return [self._brand_info_from_vision(vision_result) for vision_result in vision_results]
+
+    def _vision_timed_out(self) -> Dict[str, Any]:
+        return {"success": False, "error": "Timed out", "brand_info": dict(FALLBACK_BRAND_INFO)}
+
+    def _brand_info_from_vision(self, vision_result: Dict[str, Any]) -> Dict[str, Any]:
+        if vision_result["success"]:
+            brand_info = vision_result["brand_info"]
+            logger.info(f"Brand identified by Gemini Vision: {brand_info['brand']} (confidence: {brand_info.get('confidence', 0)})")
+        else:
+            logger.warning(f"Gemini Vision failed: {vision_result.get('error', 'Unknown error')}")
+            brand_info = vision_result["brand_info"]  # Use fallback data
+        return brand_info
+
+    async def generate_report(self, brand_info: Dict[str, Any]) -> Dict[str, Any]:
+        # Reports depend only on brand and product type, so most uploads are cache hits
+        cache_key = report_cache_key(brand_info["brand"], brand_info)
+        cached_report = await report_cache.get(cache_key)
+        if cached_report is not None:
+            logger.info(f"Sustainability report cache hit for {cache_key}")
+            return cached_report
+
+        report_result = await self.within_budget("report", fast_gemini_service.generate_sustainability_report(
+            brand=brand_info["brand"],
+            product_info=brand_info
+        ), settings.REPORT_TIMEOUT_SECONDS, lambda: {"success": False, "error": "Timed out"})
+        if not report_result["success"]:
+            logger.warning(f"Gemini report generation failed: {report_result['error']}")
+            return gemini_service._create_fallback_report()
+
+        await report_cache.set(cache_key, report_result["report_data"])
+        return report_result["report_data"]
+
+    async def generate_search_query(self, brand_info: Dict[str, Any]) -> str:
+        # Like reports, queries depend only on brand and product type
+        cache_key = report_cache_key(brand_info["brand"], brand_info)
+        cached_query = await search_query_cache.get(cache_key)
+        if cached_query is not None:
+            logger.info(f"Search query cache hit for {cache_key}")
+            return cached_query
+
+        fallback_query = fast_gemini_service.fallback_search_query(brand_info)
+        search_query = await self.within_budget("search_query", fast_gemini_service.generate_shopping_search_query(
+            brand=brand_info["brand"],
+            product_info=brand_info
+        ), settings.SEARCH_QUERY_TIMEOUT_SECONDS, lambda: fallback_query)
+        # Don't pin the generic fallback when Gemini failed or ran out of time
+        if search_query != fallback_query:
+            await search_query_cache.set(cache_key, search_query)
+        return search_query
+
+    async def find_alternatives(self, search_query: str) -> List[Dict[str, Any]]:
+        cache_key = normalize_search_query(search_query)
+        cached_alternatives = await shopping_results_cache.get(cache_key) if cache_key else None
+        if cached_alternatives is not None:
+            logger.info(f"Shopping results cache hit for '{cache_key}'")
+            return cached_alternatives
+
+        logger.info(f"Searching Google Shopping with query: {search_query}")
+        shopping_result = await self.within_budget("alternatives", google_search_service.search_shopping_results(
+            query=search_query,
+            num_results=3
+        ), settings.ALTERNATIVES_TIMEOUT_SECONDS, lambda: {"success": False, "error": "Timed out", "alternatives": []})
+        if not shopping_result["success"] or len(shopping_result["alternatives"]) == 0:
+            logger.warning(f"Google Shopping search failed or returned no results: {shopping_result.get('error', 'No results')}")
+            return FALLBACK_ALTERNATIVES
+
+        logger.info(f"Found {len(shopping_result['alternatives'])} alternatives from Google Shopping")
+        if cache_key:
+            await shopping_results_cache.set(cache_key, shopping_result["alternatives"])
+        return shopping_result["alternatives"]
+
+    def new_analysis(self, user_id: str, analysis_id: Optional[str] = None) -> Dict[str, Any]:
+        """Identifiers shared by every record of one analysis
+
+        They're generated before any stage runs so partial results (streamed
+        events, the report) can reference them before anything is written.
+        """
+        return {
+            "analysis_id": analysis_id or str(uuid.uuid4()),
+            "user_id": user_id,
+            "clothing_id": str(uuid.uuid4()),
+            "report_id": f"rep_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}",
+            "created_at": datetime.now().isoformat() + "Z"
+        }
+
+    def build_alternative_items(self, analysis: Dict[str, Any],
+                                alternatives_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        alternative_items = []
+        for i, alt_data in enumerate(alternatives_data[:3]):  # Limit to 3 alternatives
+            alternative_items.append({
+                "alternative_id": str(uuid.uuid4()),
+                "clothing_id": analysis["clothing_id"],
+                "name": alt_data.get("name", f"Alternative {i+1}"),
+                "brand": alt_data.get("brand", "Unknown Brand"),
+                "image_url": alt_data.get("image_url", ""),
+                "sustainability_score": alt_data.get("sustainability_score", 4.0),
+                "link": alt_data.get("link", ""),
+                "why_sustainable": alt_data.get("why_sustainable", "Sustainable alternative"),
+                "created_at": analysis["created_at"]
+            })
+        return alternative_items
+
+    def build_report_item(self, analysis: Dict[str, Any], brand_info: Dict[str, Any],
+                          report_data: Dict[str, Any], alternative_ids: List[str]) -> Dict[str, Any]:
+        return {
+            "report_id": analysis["report_id"],
+            "clothing_id": analysis["clothing_id"],
+            "brand": brand_info.get("brand", "Unknown Brand") or "Unknown Brand",
+            "categories": report_data.get("categories", {}),
+            "overall_score": report_data.get("overall_score", 3.0),
+            "overall_description": report_data.get("overall_description", "Sustainability analysis completed"),
+            "regional_alerts": report_data.get("regional_alerts", {}),
+            "alternative_ids": alternative_ids,
+            "created_at": analysis["created_at"]
+        }
+
+    def build_records(self, analysis: Dict[str, Any], image_url: str, brand_info: Dict[str, Any],
+                      report_data: Dict[str, Any], alternative_items: List[Dict[str, Any]],
+                      image_hash: Optional[int] = None) -> Tuple[Dict[str, List[Dict[str, Any]]], OutfitAnalysisResponse]:
+        """Build the DynamoDB items of one analysis (by table) and its response"""
+        clothing_item = {
+            "clothing_id": analysis["clothing_id"],
+            "user_id": analysis["user_id"],
+            "brand": brand_info.get("brand", "Unknown Brand") or "Unknown Brand",
+            "image_file": image_url,
+            "report_id": analysis["report_id"],
+            # Copied from the report so history lists can skip fetching reports
+            "overall_score": report_data.get("overall_score", 3.0),
+            "created_at": analysis["created_at"]
+        }
+        if image_hash is not None:
+            clothing_item["image_hash"] = f"{image_hash:016x}"
+
+        # Alternative IDs already exist, so the report is written with them
+        # instead of being patched by a follow-up update
+        alternative_ids = [item["alternative_id"] for item in alternative_items]
+        sustainability_report = self.build_report_item(analysis, brand_info, report_data, alternative_ids)
+
+        records = {
+            "clothing": [clothing_item],
+            "sustainability": [sustainability_report],
+            "alternatives": alternative_items
+        }
+        response = OutfitAnalysisResponse(
+            clothing_item=ClothingResponse(**clothing_item),
+            sustainability_report=SustainabilityReport(**sustainability_report),
+            alternatives=[AlternativeProduct(**item) for item in alternative_items],
+            analysis_id=analysis["analysis_id"],
+            created_at=analysis["created_at"]
+        )
+        return records, response
+
+    @staticmethod
+    def _merge_records(records: Iterable[Dict[str, List[Dict[str, Any]]]]) -> Dict[str, List[Dict[str, Any]]]:
+        merged: Dict[str, List[Dict[str, Any]]] = {"clothing": [], "sustainability": [], "alternatives": []}
+        for analysis_records in records:
+            for table_name, items in analysis_records.items():
+                merged[table_name].extend(items)
+        return merged
+
+    @staticmethod
+    def _write_chunks(analysed: List[Tuple[int, Dict[str, List[Dict[str, Any]]], Any]],
+                      max_items: int = 25) -> List[List[Tuple[int, Dict[str, List[Dict[str, Any]]], Any]]]:
+        """Group analyses (never split) into chunks of at most ``max_items`` items"""
+        chunks: List[List[Tuple[int, Dict[str, List[Dict[str, Any]]], Any]]] = []
+        size = max_items
+        for entry in analysed:
+            count = sum(len(items) for items in entry[1].values())
+            if size + count > max_items:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(entry)
+            size += count
+        return chunks
+
+    def _index_image(self, analysis: Dict[str, Any], image_hash: Optional[int]) -> None:
+        if image_hash is not None:
+            image_dedup_index.add(image_hash, analysis["user_id"], analysis["clothing_id"], analysis["report_id"])
+
+    async def persist(self, analysis: Dict[str, Any], image_url: str, brand_info: Dict[str, Any],
+                      report_data: Dict[str, Any], alternative_items: List[Dict[str, Any]],
+                      image_hash: Optional[int] = None) -> OutfitAnalysisResponse:
+        """Write the clothing item, report and alternatives, then return the response"""
+        records, response = self.build_records(analysis, image_url, brand_info, report_data,
+                                               alternative_items, image_hash)
+
+        # Everything goes out in a single BatchWriteItem round-trip
+        write_result = await dynamodb_service.batch_write_items(records)
+        if not write_result["success"]:
+            logger.error(f"Failed to save analysis: {write_result['error']}")
+            raise AnalysisPipelineError(500, "Failed to save analysis results")
+
+        await score_aggregates.record(records["sustainability"])
+        self._index_image(analysis, image_hash)
+        return response
+
+    def stage_event(self, analysis: Dict[str, Any], stage: str, result: Any,
+                    brand_info: Optional[Dict[str, Any]] = None) -> Optional[Tuple[str, Any]]:
+        """Map a finished stage onto the public progress event, if it has one"""
+        if stage == "upload":
+            return "image_stored", {"image_url": result}
+        if stage == "vision":
+            return "brand_identified", result
+        if stage == "report":
+            # alternative_ids are filled in by the final "persisted" event
+            return "report_ready", SustainabilityReport(**self.build_report_item(analysis, brand_info or {}, result, []))
+        if stage == "alternatives":
+            return "alternatives_found", [AlternativeProduct(**item) for item in result]
+        if stage == "persist":
+            return "persisted", result
+        return None
+
+    async def analyze_single_shot(self, processed_image: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Brand, report and search query from one Gemini call, or None to use the separate calls"""
+        image = self.vision_image(processed_image)
+        result = await self.within_budget("single_shot", fast_gemini_service.analyze_outfit(
+            image["content"],
+            mime_type=image["content_type"]
+        ), settings.REPORT_TIMEOUT_SECONDS, lambda: {"success": False, "error": "Timed out"})
+        if not result["success"]:
+            logger.warning(f"Single-shot analysis failed, falling back to separate calls: {result['error']}")
+            metrics.increment("analysis.single_shot_fallbacks")
+            return None
+        return result
+
+    def build_graph(self, analysis: Dict[str, Any], processed_image: Dict[str, Any],
+                    filename: Optional[str], single_shot: bool = False) -> StageGraph:
+        """Wire the stages for one processed image
+
+        In single-shot mode a ``single_shot`` stage asks Gemini for the brand,
+        report and search query at once, and the vision, report and
+        search_query stages just unpack it (or make their own call if it
+        failed), so events and persistence are the same in both modes.
+        """
+        async def upload() -> str:
+            return await self.upload_image(processed_image, analysis["user_id"], filename)
+
+        async def single_shot_analysis() -> Optional[Dict[str, Any]]:
+            return await self.analyze_single_shot(processed_image)
+
+        async def vision(single_shot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+            if single_shot is not None:
+                return single_shot["brand_info"]
+            return await self.identify_brand(processed_image)
+
+        async def report(vision: Dict[str, Any], single_shot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+            if single_shot is not None:
+                return single_shot["report_data"]
+            return await self.generate_report(vision)
+
+        async def search_query(vision: Dict[str, Any], single_shot: Optional[Dict[str, Any]] = None) -> str:
+            if single_shot is not None:
+                return single_shot["search_query"]
+            return await self.generate_search_query(vision)
+
+        async def alternatives(search_query: str) -> List[Dict[str, Any]]:
+            return self.build_alternative_items(analysis, await self.find_alternatives(search_query))
+
+        async def persist(upload: str, vision: Dict[str, Any], report: Dict[str, Any],
+                          alternatives: List[Dict[str, Any]]) -> OutfitAnalysisResponse:
+            return await self.persist(analysis, upload, vision, report, alternatives,
+                                      image_hash=processed_image.get("image_hash"))
+
+        graph = StageGraph(f"analysis {analysis['analysis_id']}")
+        graph.add_stage("upload", upload)
+        if single_shot:
+            graph.add_stage("single_shot", single_shot_analysis)
+            graph.add_stage("vision", vision, depends_on=["single_shot"])
+            graph.add_stage("report", report, depends_on=["vision", "single_shot"])
+            graph.add_stage("search_query", search_query, depends_on=["vision", "single_shot"])
+        else:
+            graph.add_stage("vision", vision)
+            graph.add_stage("report", report, depends_on=["vision"])
+            graph.add_stage("search_query", search_query, depends_on=["vision"])
+        graph.add_stage("alternatives", alternatives, depends_on=["search_query"])
+        graph.add_stage("persist", persist, depends_on=["upload", "vision", "report", "alternatives"])
+        return graph
+
+    async def run(self, user_id: str, image_content: bytes, filename: Optional[str] = None,
+                  analysis_id: Optional[str] = None,
+                  on_event: Optional[EventCallback] = None,
+                  single_shot: Optional[bool] = None) -> OutfitAnalysisResponse:
+        """Analyze one uploaded image and return the stored analysis
+
+        ``on_event(event, payload)`` is awaited as each stage finishes with
+        one of: image_stored, brand_identified, report_ready,
+        alternatives_found, persisted (payload is the full response).
+        ``single_shot`` defaults to settings.SINGLE_SHOT_ANALYSIS.
+
+        The whole analysis gets ANALYSIS_DEADLINE_SECONDS; each stage may use
+        its own slice of whatever is left and degrades to its fallback when
+        that runs out (see ``within_budget``).
+        """
+        if single_shot is None:
+            single_shot = settings.SINGLE_SHOT_ANALYSIS
+        analysis = self.new_analysis(user_id, analysis_id)
+
+        with deadline(settings.ANALYSIS_DEADLINE_SECONDS):
+            processed_image = await self.process_image(image_content)
+            duplicate = await self.find_duplicate(user_id, processed_image, analysis["analysis_id"])
+            if duplicate is not None:
+                if on_event is not None:
+                    await on_event("persisted", duplicate)
+                return duplicate
+
+            graph = self.build_graph(analysis, processed_image, filename, single_shot=single_shot)
+            stage_results: Dict[str, Any] = {}
+
+            async def on_stage_complete(stage: str, result: Any) -> None:
+                stage_results[stage] = result
+                event = self.stage_event(analysis, stage, result, brand_info=stage_results.get("vision"))
+                if event is not None and on_event is not None:
+                    await on_event(*event)
+
+            results = await graph.run(on_stage_complete=on_stage_complete)
+            return results["persist"]
+
+    async def run_batch(self, user_id: str, uploads: List[Tuple[bytes, Optional[str]]]) -> List[Dict[str, Any]]:
+        """Analyze several uploads together and return one result per upload
+
+        Runs the same stages as ``run`` with these batch-level savings:
+        - at most BATCH_ANALYSIS_CONCURRENCY stage calls run at once per batch
+        - images are identified BATCH_VISION_GROUP_SIZE at a time in a single
+          multi-image Gemini Vision request
+        - items with the same brand and product type share one report call
+        - items are persisted in concurrent BatchWriteItem calls of whole analyses
+
+        Each result is ``{"filename", "analysis", "error"}``; one failing item
+        doesn't fail the rest.
+
+        The batch gets ANALYSIS_DEADLINE_SECONDS plus
+        BATCH_DEADLINE_SECONDS_PER_IMAGE for every image after the first;
+        stages past their slice use their fallbacks as in ``run``.
+        """
+        seconds = settings.ANALYSIS_DEADLINE_SECONDS + settings.BATCH_DEADLINE_SECONDS_PER_IMAGE * max(0, len(uploads) - 1)
+        with deadline(seconds):
+            return await self._analyse_batch(user_id, uploads)
+
+    async def _analyse_batch(self, user_id: str, uploads: List[Tuple[bytes, Optional[str]]]) -> List[Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(settings.BATCH_ANALYSIS_CONCURRENCY)
+
+        async def bounded(func: StageFunc, *args) -> Any:
+            async with semaphore:
+                return await func(*args)
+
+        results: List[Dict[str, Any]] = [
+            {"filename": filename, "analysis": None, "error": None} for _, filename in uploads
+        ]
+        analyses = [self.new_analysis(user_id) for _ in uploads]
+        processed_images = await asyncio.gather(*[bounded(self.process_image, content) for content, _ in uploads])
+
+        duplicates = await asyncio.gather(*[
+            self.find_duplicate(user_id, processed_image, analyses[i]["analysis_id"])
+            for i, processed_image in enumerate(processed_images)
+        ])
+        pending = []
+        for i, duplicate in enumerate(duplicates):
+            if duplicate is not None:
+                results[i]["analysis"] = duplicate
+            else:
+                pending.append(i)
+
+        group_size = settings.BATCH_VISION_GROUP_SIZE
+        groups = [pending[start:start + group_size] for start in range(0, len(pending), group_size)]
+        group_brand_infos = await asyncio.gather(*[
+            bounded(self.identify_brands, [processed_images[i] for i in group]) for group in groups
+        ])
+        brand_infos = {i: brand_info for group, infos in zip(groups, group_brand_infos)
+                       for i, brand_info in zip(group, infos)}
+
+        report_tasks: Dict[str, asyncio.Task] = {}
+
+        def shared_report(brand_info: Dict[str, Any]) -> asyncio.Task:
+            cache_key = report_cache_key(brand_info["brand"], brand_info)
+            if cache_key not in report_tasks:
+                report_tasks[cache_key] = asyncio.create_task(bounded(self.generate_report, brand_info))
+            return report_tasks[cache_key]
+
+        async def analyse(i: int) -> Tuple[Dict[str, List[Dict[str, Any]]], OutfitAnalysisResponse]:
+            brand_info = brand_infos[i]
+
+            async def alternatives() -> List[Dict[str, Any]]:
+                search_query = await bounded(self.generate_search_query, brand_info)
+                return self.build_alternative_items(analyses[i], await bounded(self.find_alternatives, search_query))
+
+            image_url, report_data, alternative_items = await asyncio.gather(
+                bounded(self.upload_image, processed_images[i], user_id, uploads[i][1]),
+                shared_report(brand_info),
+                alternatives()
+            )
+            return self.build_records(analyses[i], image_url, brand_info, report_data, alternative_items,
+                                      image_hash=processed_images[i].get("image_hash"))
+
+        outcomes = await asyncio.gather(*[analyse(i) for i in pending], return_exceptions=True)
+        logger.info(f"Batch analysis: {len(uploads)} images, {len(pending)} analysed, "
+                    f"{len(groups)} vision requests, {len(report_tasks)} distinct reports")
+
+        analysed = []
+        for i, outcome in zip(pending, outcomes):
+            if isinstance(outcome, AnalysisPipelineError):
+                results[i]["error"] = outcome.detail
+            elif isinstance(outcome, Exception):
+                logger.error(f"Batch item {i} failed: {str(outcome)}")
+                results[i]["error"] = f"Analysis failed: {str(outcome)}"
+            else:
+                analysed.append((i, *outcome))
+
+        # Each chunk holds whole analyses and fits one BatchWriteItem call, so
+        # a failed chunk only fails its own items
+        chunks = self._write_chunks(analysed)
+        write_results = await asyncio.gather(*[
+            dynamodb_service.batch_write_items(self._merge_records(records for _, records, _ in chunk))
+            for chunk in chunks
+        ])
+        for chunk, write_result in zip(chunks, write_results):
+            if not write_result["success"]:
+                logger.error(f"Failed to save {len(chunk)} batch analyses: {write_result['error']}")
+                for i, _, _ in chunk:
+                    results[i]["error"] = "Failed to save analysis results"
+                continue
+            for i, _, response in chunk:
+                results[i]["analysis"] = response
+                self._index_image(analyses[i], processed_images[i].get("image_hash"))
+            await score_aggregates.record([report for _, records, _ in chunk for report in records["sustainability"]])
+
+        return results
+
+
+@functools.lru_cache(maxsize=None)
+def get_outfit_analysis_pipeline() -> OutfitAnalysisPipeline:
+    """FastAPI dependency / provider for the process-wide pipeline"""
+    return OutfitAnalysisPipeline()
+
+
+def __getattr__(name: str):
+    # Keeps `from services.analysis_pipeline import outfit_analysis_pipeline` working
+    if name == "outfit_analysis_pipeline":
+        return get_outfit_analysis_pipeline()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
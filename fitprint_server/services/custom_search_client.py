@@ -0,0 +1,98 @@
+"""
+Async client for the Google Custom Search JSON API
+
+A thin replacement for googleapiclient's blocking ``cse().list().execute()``:
+one pooled keep-alive httpx client per process, a per-call timeout and a
+semaphore capping concurrent searches. 5xx responses are retried up to
+SEARCH_MAX_RETRIES times with backoff. 429s are not (Custom Search sends them
+once the daily or per-minute quota is spent, so a retry only spends another
+request), nor are timeouts, since the query may already have been billed. ``base_url`` (or an httpx
+``transport``) can point it at a local stub server for tests.
+"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from config import settings
+from services.metrics import metrics
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class CustomSearchError(Exception):
+    """Non-2xx response from the Custom Search API"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Custom Search returned HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+class CustomSearchClient:
+    """GET {base_url}?key=...&cx=...&q=... returning the decoded JSON"""
+
+    def __init__(self, api_key: str, base_url: str = settings.SEARCH_BASE_URL,
+                 timeout: float = settings.SEARCH_TIMEOUT_SECONDS,
+                 max_in_flight: int = settings.SEARCH_MAX_IN_FLIGHT,
+                 max_retries: int = settings.SEARCH_MAX_RETRIES,
+                 retry_backoff: float = 0.25,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.transport = transport
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        # Created (and httpx imported) on first use, inside the running event loop
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_in_flight,
+                                    max_keepalive_connections=self.max_in_flight),
+                headers={"Accept": "application/json"},
+                transport=self.transport
+            )
+        return self._client
+
+    async def list(self, *, max_retries: Optional[int] = None, **params: Any) -> Dict[str, Any]:
+        """The ``cse.list`` method: search with the given query parameters
+
+        ``max_retries`` overrides the client's retry limit for this call.
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
+        for attempt in range(max_retries + 1):
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await self._get_client().get(self.base_url, params={"key": self.api_key, **params})
+                finally:
+                    metrics.observe("search.request_ms", (time.perf_counter() - started) * 1000)
+
+            if response.status_code < 400:
+                return response.json()
+            if response.status_code < 500 or attempt == max_retries:
+                break
+            metrics.increment("search.retries")
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+        try:
+            message = response.json().get("error", {}).get("message", response.text)
+        except ValueError:
+            message = response.text
+        raise CustomSearchError(response.status_code, message[:200])
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,62 +1,49 @@
 """
 Fast Gemini service for quick testing
 """
-import google.generativeai as genai
 from typing import Dict, Any, List
-import json
+import asyncio
 import logging
-from config import settings
-from prompts.fast_prompts import FAST_SUSTAINABILITY_PROMPT, FAST_ALTERNATIVES_PROMPT
+from prompts.fast_prompts import (
+    FAST_SUSTAINABILITY_PROMPT,
+    FAST_ALTERNATIVES_PROMPT,
+    BRAND_IDENTIFICATION_PROMPT,
+    BATCH_BRAND_IDENTIFICATION_PROMPT,
+    SINGLE_SHOT_ANALYSIS_PROMPT
+)
+from api.models import BrandInfo, ReportContent, SingleShotAnalysis, AlternativeSuggestion
+from services.llm_client import llm_client
+from services.llm_json import generate_json
 
 logger = logging.getLogger(__name__)
 
+# Used when the brand can't be identified
+FALLBACK_BRAND_INFO = {
+    "brand": "Unknown Brand",
+    "product_title": "Clothing Item",
+    "product_description": "Unable to identify from image",
+    "confidence": 0.0
+}
+
 class FastGeminiService:
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.vision_model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model_name = 'gemini-2.5-flash'
+        self.vision_model_name = 'gemini-2.5-flash'
+
+    async def identify_brand_from_image(self, image_content: bytes, mime_type: str = "image/jpeg") -> Dict[str, Any]:
+        """Use Gemini Vision to identify the brand from an image
 
-    async def identify_brand_from_image(self, image_url: str) -> Dict[str, Any]:
-        """Use Gemini Vision to identify the brand from an image"""
+        Takes the already-processed upload bytes, so the image is sent inline
+        without being re-downloaded from S3 or decoded again.
+        """
         try:
-            import requests
-            from PIL import Image
-            import io
-            
-            # Download the image
-            response = requests.get(image_url, timeout=10)
-            image = Image.open(io.BytesIO(response.content))
-            
-            prompt = """
-            Look at this clothing item image and identify:
-            1. The brand name - look for ANY visible logos, tags, labels, or distinctive design elements
-            2. If you can't see a clear brand, make your BEST GUESS based on the style, quality, and design
-            3. NEVER say "Unknown" - always provide a specific brand name guess
-            4. The type of clothing item
-            5. Any visible details about materials or style
-            
-            Common brands to consider: Nike, Adidas, H&M, Zara, Uniqlo, Gap, Old Navy, Target, Walmart, Shein, Fashion Nova, Forever 21, Urban Outfitters, American Eagle, Hollister, Abercrombie, Lululemon, Patagonia, North Face, Columbia, Champion, Puma, Reebok, Under Armour, Ralph Lauren, Tommy Hilfiger, Calvin Klein, Levi's, Wrangler, Carhartt, Dickies, etc.
-            
-            Return ONLY a JSON object with this structure:
-            {
-                "brand": "Specific Brand Name (make your best guess, never say Unknown)",
-                "product_title": "Brief description of the item",
-                "product_description": "More detailed description including visible features",
-                "confidence": 0.0 to 1.0
-            }
-            """
-            
-            response = self.vision_model.generate_content([prompt, image])
+            image = {"mime_type": mime_type, "data": image_content}
             
-            # Parse the response
-            text = response.text.strip()
-            if text.startswith("```"):
-                text = text.replace("```json", "", 1).replace("```", "", 1)
-                if text.endswith("```"):
-                    text = text[:-3]
-                text = text.strip()
-            
-            brand_info = json.loads(text)
+            identified = await generate_json(
+                [BRAND_IDENTIFICATION_PROMPT, image], BrandInfo,
+                purpose="brand_identification", model_name=self.vision_model_name
+            )
+            brand_info = identified.model_dump()
             logger.info(f"Gemini Vision identified brand: {brand_info.get('brand', 'Unknown')}")
             
             return {
@@ -69,12 +56,76 @@ class FastGeminiService:
             return {
                 "success": False,
                 "error": str(e),
-                "brand_info": {
-                    "brand": "Unknown Brand",
-                    "product_title": "Clothing Item",
-                    "product_description": "Unable to identify from image",
-                    "confidence": 0.0
-                }
+                "brand_info": dict(FALLBACK_BRAND_INFO)
+            }
+
+    async def identify_brands_from_images(self, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Identify the brands of several images with a single Gemini Vision request
+
+        ``images`` are processed-image dicts (``content``/``content_type``).
+        Returns one identify_brand_from_image-style result per image, in order.
+        If the combined response can't be matched back to the images, each
+        image is retried on its own.
+        """
+        if len(images) == 1:
+            return [await self.identify_brand_from_image(images[0]["content"], mime_type=images[0]["content_type"])]
+
+        try:
+            contents: List[Any] = [BATCH_BRAND_IDENTIFICATION_PROMPT.format(count=len(images))]
+            for number, image in enumerate(images, 1):
+                contents.append(f"Image {number}:")
+                contents.append({"mime_type": image["content_type"], "data": image["content"]})
+            
+            brand_infos = await generate_json(
+                contents, List[BrandInfo],
+                purpose="batch_brand_identification", model_name=self.vision_model_name
+            )
+            if len(brand_infos) != len(images):
+                raise ValueError(f"Expected {len(images)} results, got {len(brand_infos)}")
+            
+            logger.info(f"Gemini Vision identified {len(brand_infos)} brands in one request")
+            return [{"success": True, "brand_info": brand_info.model_dump()} for brand_info in brand_infos]
+            
+        except Exception as e:
+            logger.warning(f"Batched Gemini Vision request failed, identifying images one by one: {str(e)}")
+            return await asyncio.gather(*[
+                self.identify_brand_from_image(image["content"], mime_type=image["content_type"])
+                for image in images
+            ])
+
+    async def analyze_outfit(self, image_content: bytes, mime_type: str = "image/jpeg") -> Dict[str, Any]:
+        """Identify the item, rate it and write its shopping query in one Gemini call
+
+        Single-shot alternative to identify_brand_from_image followed by
+        generate_sustainability_report and generate_shopping_search_query.
+        The response is validated against the report models, so anything
+        returned with success=True has the same shape the three-call path
+        produces; on failure callers should fall back to that path.
+        """
+        try:
+            image = {"mime_type": mime_type, "data": image_content}
+            
+            analysis = await generate_json(
+                [SINGLE_SHOT_ANALYSIS_PROMPT, image], SingleShotAnalysis,
+                purpose="single_shot_analysis", model_name=self.vision_model_name
+            )
+            brand_info = analysis.brand_info.model_dump()
+            report_data = analysis.report.dict(exclude_none=True)
+            report_data["brand"] = brand_info["brand"]
+            logger.info(f"Gemini single-shot analysis identified brand: {brand_info['brand']}")
+            
+            return {
+                "success": True,
+                "brand_info": brand_info,
+                "report_data": report_data,
+                "search_query": self._finalize_search_query(analysis.search_query)
+            }
+            
+        except Exception as e:
+            logger.error(f"Gemini single-shot analysis failed: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
             }
 
     async def generate_sustainability_report(self, brand: str, product_info: Dict[str, Any]) -> Dict[str, Any]:
@@ -86,50 +137,14 @@ class FastGeminiService:
                 product_description=product_info.get("product_description", "Unknown description")
             )
             
-            response = self.model.generate_content(prompt)
-            
-            # Log the raw response for debugging
-            logger.info(f"Gemini raw response: {response.text[:500]}")
-            
-            # Parse JSON response - handle markdown code blocks
-            try:
-                text = response.text.strip()
-                # Remove markdown code blocks if present
-                if text.startswith("```"):
-                    # Remove opening ```json or ``` and closing ```
-                    text = text.replace("```json", "", 1).replace("```", "", 1)
-                    # Remove any remaining ``` at the end
-                    if text.endswith("```"):
-                        text = text[:-3]
-                    text = text.strip()
-                
-                report_data = json.loads(text)
-                logger.info("Successfully parsed Gemini response as JSON")
-                return {
-                    "success": True,
-                    "report_data": report_data
-                }
-            except json.JSONDecodeError as e:
-                logger.warning(f"Failed to parse Gemini response as JSON: {e}")
-                logger.warning(f"Raw response was: {response.text}")
-                # Fallback to default data with varied scores
-                return {
-                    "success": True,
-                    "report_data": {
-                        "brand": brand,
-                        "categories": {
-                            "material_origin": {"score": 4, "description": "Uses some sustainable materials like organic cotton"},
-                            "production_impact": {"score": 2, "description": "High water usage and carbon emissions in production"},
-                            "labor_ethics": {"score": 3, "description": "Standard labor practices, no transparency on working conditions"},
-                            "end_of_life": {"score": 3, "description": "Mixed materials make recycling difficult"},
-                            "brand_transparency": {"score": 2, "description": "Limited information about supply chain and sustainability efforts"}
-                        },
-                        "overall_score": 2.8,
-                        "overall_description": "This item has mixed sustainability characteristics with room for improvement.",
-                        "regional_alerts": {},
-                        "alternative_ids": []
-                    }
-                }
+            report = await generate_json(prompt, ReportContent, purpose="sustainability_report", model_name=self.model_name)
+            report_data = report.dict(exclude_none=True)
+            report_data["brand"] = brand
+            logger.info("Successfully parsed Gemini sustainability report")
+            return {
+                "success": True,
+                "report_data": report_data
+            }
             
         except Exception as e:
             logger.error(f"Fast Gemini report generation failed: {str(e)}")
@@ -156,25 +171,33 @@ class FastGeminiService:
             Return ONLY the search query text, nothing else. Example: "buy sustainable organic cotton men's t-shirt"
             """
             
-            response = self.model.generate_content(prompt)
-            search_query = response.text.strip().replace('"', '').replace("'", "")
-            
-            # Ensure "clothing" or "apparel" is in the query
-            if "clothing" not in search_query.lower() and "apparel" not in search_query.lower():
-                search_query = f"{search_query} clothing"
-            
-            # Ensure "buy" or "shop" is in the query for shopping results
-            if "buy" not in search_query.lower() and "shop" not in search_query.lower():
-                search_query = f"buy {search_query}"
+            response = await llm_client.generate(prompt, model_name=self.model_name)
+            search_query = self._finalize_search_query(response.text)
             
             logger.info(f"Generated shopping search query: {search_query}")
             return search_query
             
         except Exception as e:
             logger.error(f"Failed to generate search query: {str(e)}")
-            # Fallback to basic query
-            product_type = product_info.get("product_title", "clothing").split()[0].lower()
-            return f"buy sustainable eco-friendly {product_type} clothing"
+            return self.fallback_search_query(product_info)
+
+    def fallback_search_query(self, product_info: Dict[str, Any]) -> str:
+        """Basic shopping query built without the model"""
+        product_type = (product_info.get("product_title") or "clothing").split()[0].lower()
+        return f"buy sustainable eco-friendly {product_type} clothing"
+
+    def _finalize_search_query(self, search_query: str) -> str:
+        search_query = search_query.strip().replace('"', '').replace("'", "")
+        
+        # Ensure "clothing" or "apparel" is in the query
+        if "clothing" not in search_query.lower() and "apparel" not in search_query.lower():
+            search_query = f"{search_query} clothing"
+        
+        # Ensure "buy" or "shop" is in the query for shopping results
+        if "buy" not in search_query.lower() and "shop" not in search_query.lower():
+            search_query = f"buy {search_query}"
+        
+        return search_query
     
     async def find_sustainable_alternatives(self, brand: str, product_info: Dict[str, Any]) -> Dict[str, Any]:
         """Find 3 sustainable alternatives quickly - DEPRECATED, use Google Shopping instead"""
@@ -185,63 +208,16 @@ class FastGeminiService:
                 product_description=product_info.get("product_description", "Clothing item")
             )
             
-            response = self.model.generate_content(prompt)
-            
-            # Log the raw response for debugging
-            logger.info(f"Gemini alternatives raw response: {response.text[:500]}")
-            
-            # Parse JSON response - handle markdown code blocks
-            try:
-                text = response.text.strip()
-                # Remove markdown code blocks if present
-                if text.startswith("```"):
-                    # Remove opening ```json or ``` and closing ```
-                    text = text.replace("```json", "", 1).replace("```", "", 1)
-                    # Remove any remaining ``` at the end
-                    if text.endswith("```"):
-                        text = text[:-3]
-                    text = text.strip()
-                
-                alternatives = json.loads(text)
-                logger.info(f"Successfully parsed {len(alternatives)} alternatives from Gemini")
-                logger.info(f"Alternatives data: {json.dumps(alternatives, indent=2)}")
-                return {
-                    "success": True,
-                    "alternatives": alternatives
-                }
-            except json.JSONDecodeError as e:
-                logger.warning(f"Failed to parse Gemini alternatives as JSON: {e}")
-                logger.warning(f"Raw response was: {response.text}")
-                # Fallback to default alternatives with varied data
-                return {
-                    "success": True,
-                    "alternatives": [
-                        {
-                            "name": "Organic Cotton T-Shirt",
-                            "brand": "Patagonia",
-                            "image_url": "",
-                            "sustainability_score": 4.5,
-                            "link": "https://www.patagonia.com",
-                            "why_sustainable": "Made with 100% organic cotton and Fair Trade certified"
-                        },
-                        {
-                            "name": "Recycled Polyester Hoodie", 
-                            "brand": "Reformation",
-                            "image_url": "",
-                            "sustainability_score": 4.2,
-                            "link": "https://www.thereformation.com",
-                            "why_sustainable": "Uses recycled polyester from plastic bottles, carbon neutral shipping"
-                        },
-                        {
-                            "name": "Hemp Blend Jeans",
-                            "brand": "Everlane", 
-                            "image_url": "",
-                            "sustainability_score": 4.7,
-                            "link": "https://www.everlane.com",
-                            "why_sustainable": "Hemp requires 50% less water than cotton, biodegradable materials"
-                        }
-                    ]
-                }
+            suggestions = await generate_json(
+                prompt, List[AlternativeSuggestion],
+                purpose="alternatives", model_name=self.model_name
+            )
+            alternatives = [suggestion.model_dump() for suggestion in suggestions]
+            logger.info(f"Successfully parsed {len(alternatives)} alternatives from Gemini")
+            return {
+                "success": True,
+                "alternatives": alternatives
+            }
             
         except Exception as e:
             logger.error(f"Fast Gemini alternatives generation failed: {str(e)}")
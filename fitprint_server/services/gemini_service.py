@@ -1,26 +1,27 @@
-import google.generativeai as genai
 from typing import Dict, Any, List
-from config import settings
-import json
 import logging
+from pydantic import ValidationError
+from api.models import ReportContent, AlternativeSuggestions
+from services.llm_json import generate_json, JSONExtractionError
 
 logger = logging.getLogger(__name__)
 
 class GeminiService:
     def __init__(self):
-        self.api_key = settings.GEMINI_API_KEY
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model_name = 'gemini-2.5-flash'
 
     async def generate_sustainability_report(self, brand: str, product_info: Dict[str, Any], image_url: str = None) -> Dict[str, Any]:
         """Generate a sustainability report using Gemini AI"""
         try:
             prompt = self._build_sustainability_prompt(brand, product_info, image_url)
             
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response to extract structured data
-            report_data = self._parse_sustainability_response(response.text)
+            try:
+                report = await generate_json(prompt, ReportContent, purpose="sustainability_report", model_name=self.model_name)
+                report_data = report.model_dump()
+                report_data["brand"] = brand
+            except (JSONExtractionError, ValidationError) as e:
+                logger.warning(f"Failed to parse Gemini sustainability report, using fallback: {str(e)}")
+                report_data = self._create_fallback_report()
             
             return {
                 "success": True,
@@ -39,10 +40,12 @@ class GeminiService:
         try:
             prompt = self._build_alternatives_prompt(brand, product_info)
             
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response to extract alternatives
-            alternatives = self._parse_alternatives_response(response.text)
+            try:
+                suggestions = await generate_json(prompt, AlternativeSuggestions, purpose="alternatives", model_name=self.model_name)
+                alternatives = [suggestion.model_dump() for suggestion in suggestions.alternatives]
+            except (JSONExtractionError, ValidationError) as e:
+                logger.warning(f"Failed to parse Gemini alternatives, using fallback: {str(e)}")
+                alternatives = self._create_fallback_alternatives()
             
             return {
                 "success": True,
@@ -183,42 +186,6 @@ Provide realistic, purchasable alternatives with actual brand names and products
 """
         return prompt
 
-    def _parse_sustainability_response(self, response_text: str) -> Dict[str, Any]:
-        """Parse Gemini response to extract sustainability report data"""
-        try:
-            # Try to extract JSON from the response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx]
-                return json.loads(json_str)
-            else:
-                # Fallback: create a basic structure
-                return self._create_fallback_report()
-                
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse Gemini response as JSON, using fallback")
-            return self._create_fallback_report()
-
-    def _parse_alternatives_response(self, response_text: str) -> List[Dict[str, Any]]:
-        """Parse Gemini response to extract alternatives data"""
-        try:
-            # Try to extract JSON from the response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx]
-                data = json.loads(json_str)
-                return data.get('alternatives', [])
-            else:
-                return self._create_fallback_alternatives()
-                
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse Gemini alternatives response as JSON, using fallback")
-            return self._create_fallback_alternatives()
-
     def _create_fallback_report(self) -> Dict[str, Any]:
         """Create a fallback sustainability report when parsing fails"""
         return {
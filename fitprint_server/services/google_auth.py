@@ -0,0 +1,147 @@
+"""
+Google ID-token verification with cached signing certificates
+
+google.oauth2.id_token.verify_oauth2_token downloads Google's certs on every
+call. Here the certs are kept for their Cache-Control max-age and refreshed
+in the background shortly before they expire, and tokens that already
+verified are remembered (by digest) until their ``exp``, so signing in is a
+local signature check or a cache hit rather than an HTTPS round-trip.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+from google.auth import exceptions, jwt
+
+from config import settings
+from services.metrics import metrics
+from services.ttl_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = {"accounts.google.com", "https://accounts.google.com"}
+
+# Used when the certs response has no max-age (Google normally sends ~6 hours)
+_DEFAULT_CERTS_MAX_AGE = 3600
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+# Unknown key IDs trigger at most one forced refresh per this many seconds
+_MIN_FORCED_REFRESH_INTERVAL = 60
+
+
+def _max_age(headers: Dict[str, str]) -> int:
+    """Seconds the certs response may be cached for (max-age minus Age)"""
+    headers = {key.lower(): value for key, value in headers.items()}
+    match = _MAX_AGE.search(headers.get("cache-control", ""))
+    if not match:
+        return _DEFAULT_CERTS_MAX_AGE
+    try:
+        age = int(headers.get("age", 0))
+    except ValueError:
+        age = 0
+    return max(0, int(match.group(1)) - age)
+
+
+class GoogleTokenVerifier:
+    """Verify Google ID tokens for one OAuth client ID"""
+
+    def __init__(self, client_id: Optional[str], certs_url: str = GOOGLE_CERTS_URL,
+                 refresh_margin: float = settings.GOOGLE_CERTS_REFRESH_MARGIN_SECONDS,
+                 max_cached_tokens: int = settings.AUTH_TOKEN_CACHE_MAX_ENTRIES):
+        self.client_id = client_id
+        self.certs_url = certs_url
+        self.refresh_margin = refresh_margin
+        self._request = None
+        self._certs: Dict[str, str] = {}
+        self._certs_expire_at = 0.0
+        self._refreshed_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        # Only ever holds tokens that verified; entries expire at the token's exp
+        self._verified = LRUCache(max_entries=max_cached_tokens, ttl_seconds=0)
+
+    def _fetch_certs(self) -> Dict[str, Any]:
+        if self._request is None:
+            # requests is slow to import; only load it when certs are first needed
+            from google.auth.transport import requests as google_requests
+
+            self._request = google_requests.Request()
+        response = self._request(url=self.certs_url, method="GET")
+        if response.status != 200:
+            raise exceptions.TransportError(f"Could not fetch Google certificates: HTTP {response.status}")
+        data = response.data.decode("utf-8") if isinstance(response.data, bytes) else response.data
+        return {"certs": json.loads(data), "max_age": _max_age(dict(response.headers))}
+
+    async def _refresh_certs(self) -> Dict[str, str]:
+        started = time.perf_counter()
+        fetched = await asyncio.to_thread(self._fetch_certs)
+        self._certs = fetched["certs"]
+        self._certs_expire_at = time.time() + fetched["max_age"]
+        self._refreshed_at = time.monotonic()
+        metrics.increment("auth.cert_refreshes")
+        metrics.observe("auth.cert_refresh_ms", (time.perf_counter() - started) * 1000)
+        logger.info(f"Refreshed {len(self._certs)} Google signing certs (cached for {fetched['max_age']}s)")
+        return self._certs
+
+    def _start_refresh(self) -> asyncio.Task:
+        """Share one in-flight refresh between every caller that needs it"""
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._refresh_certs())
+            self._refresh.add_done_callback(self._log_refresh_failure)
+        return self._refresh
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            metrics.increment("auth.cert_refresh_failures")
+            logger.warning(f"Failed to refresh Google signing certs: {task.exception()}")
+
+    async def get_certs(self, force: bool = False) -> Dict[str, str]:
+        """Google's current signing certs, keyed by ``kid``
+
+        Fresh certs are returned as-is. Within ``refresh_margin`` of expiry a
+        refresh starts in the background and the cached certs are still used;
+        only missing or expired certs (or ``force``) make the caller wait. If
+        that refresh fails, expired certs are used rather than failing sign-in.
+        """
+        left = self._certs_expire_at - time.time()
+        if self._certs and not force and left > 0:
+            if left <= self.refresh_margin:
+                self._start_refresh()
+            return self._certs
+        try:
+            # shield: a caller giving up shouldn't cancel the refresh others are waiting on
+            return await asyncio.shield(self._start_refresh())
+        except exceptions.TransportError:
+            if not self._certs:
+                raise
+            return self._certs
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Return the claims of a valid ID token; raise ValueError otherwise"""
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self._verified.get(digest)
+        if claims is not None:
+            metrics.increment("auth.token_cache_hits")
+            return claims
+        metrics.increment("auth.token_cache_misses")
+
+        certs = await self.get_certs()
+        key_id = jwt.decode_header(token).get("kid")
+        if (key_id is not None and key_id not in certs
+                and time.monotonic() - self._refreshed_at >= _MIN_FORCED_REFRESH_INTERVAL):
+            # Google rotated its keys before our cached copy expired
+            certs = await self.get_certs(force=True)
+
+        claims = jwt.decode(token, certs=certs, audience=self.client_id, clock_skew_in_seconds=10)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+
+        self._verified.set(digest, claims, expires_at=float(claims["exp"]))
+        return claims
+
+
+google_token_verifier = GoogleTokenVerifier(settings.GOOGLE_CLIENT_ID)
@@ -1,15 +1,49 @@
-from googleapiclient.discovery import build
 from typing import Dict, Any, List, Optional
 from config import settings
+from services.metrics import metrics
+from services.custom_search_client import CustomSearchClient, CustomSearchError
+from services.resilience import circuit_breaker, hedged, within
+from services.search_lexicon import get_search_lexicon
+from urllib.parse import urlsplit
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Custom Search returns at most 10 results per request and 100 per query
+RESULTS_PER_PAGE = 10
+MAX_RESULT_PAGES = 10
+
+def is_search_outage(error: BaseException) -> bool:
+    """Breaker predicate: quota/5xx responses and network errors count, bad requests don't"""
+    if isinstance(error, CustomSearchError):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
 class GoogleSearchService:
     def __init__(self):
         self.api_key = settings.GOOGLE_API_KEY
         self.search_engine_id = settings.GOOGLE_SEARCH_ENGINE_ID
-        self.service = build("customsearch", "v1", developerKey=self.api_key)
+        self.client = CustomSearchClient(self.api_key)
+        self.breaker = circuit_breaker("search", is_failure=is_search_outage)
+
+    async def _execute(self, search_params: Dict[str, Any], hedge: bool = True, retry: bool = True) -> Dict[str, Any]:
+        """Run a Custom Search list call on the pooled async client
+
+        Each attempt is capped at SEARCH_TIMEOUT_SECONDS and goes through the
+        search circuit breaker. Custom Search bills every query, so a slow
+        one is only hedged if SEARCH_HEDGE_AFTER_SECONDS is set (off by default)
+        and ``hedge`` is true, and 5xx responses are only retried if ``retry`` is.
+        """
+        max_retries = None if retry else 0
+
+        async def attempt():
+            return await self.breaker.call(lambda: within(
+                self.client.list(max_retries=max_retries, **search_params), settings.SEARCH_TIMEOUT_SECONDS))
+
+        if not hedge:
+            return await attempt()
+        return await hedged(attempt, settings.SEARCH_HEDGE_AFTER_SECONDS, name="search", should_retry=is_search_outage)
 
     async def reverse_image_search(self, image_url: str) -> Dict[str, Any]:
         """Perform reverse image search using Google Custom Search API"""
@@ -24,7 +58,7 @@ class GoogleSearchService:
             }
             
             # Perform the search
-            result = self.service.cse().list(**search_params).execute()
+            result = await self._execute(search_params)
             
             # Parse results to extract brand and product information
             search_results = result.get('items', [])
@@ -46,6 +80,7 @@ class GoogleSearchService:
 
     def _extract_brand_info(self, search_results: List[Dict]) -> Dict[str, Any]:
         """Extract brand and product information from search results"""
+        lexicon = get_search_lexicon()
         brands = {}
         products = []
         
@@ -54,20 +89,9 @@ class GoogleSearchService:
             snippet = item.get('snippet', '')
             link = item.get('link', '')
             
-            # Extract brand names (common fashion brands)
-            brand_keywords = [
-                'nike', 'adidas', 'puma', 'under armour', 'lululemon', 'patagonia',
-                'north face', 'columbia', 'gap', 'h&m', 'zara', 'uniqlo', 'target',
-                'walmart', 'amazon', 'shein', 'fashion nova', 'urban outfitters',
-                'forever 21', 'hollister', 'abercrombie', 'calvin klein', 'tommy hilfiger',
-                'ralph lauren', 'levi\'s', 'wrangler', 'dickies', 'carhartt'
-            ]
-            
-            # Check for brand mentions
-            text_to_search = f"{title} {snippet}".lower()
-            for brand in brand_keywords:
-                if brand in text_to_search:
-                    brands[brand] = brands.get(brand, 0) + 1
+            # Count each fashion brand once per result that mentions it
+            for brand in lexicon.fashion_brands_in(f"{title} {snippet}"):
+                brands[brand] = brands.get(brand, 0) + 1
             
             # Extract product information
             product_info = {
@@ -105,7 +129,7 @@ class GoogleSearchService:
                 'searchType': 'image'
             }
             
-            result = self.service.cse().list(**search_params).execute()
+            result = await self._execute(search_params)
             search_results = result.get('items', [])
             
             return {
@@ -121,59 +145,110 @@ class GoogleSearchService:
                 "error": f"Text search failed: {str(e)}"
             }
     
-    async def search_shopping_results(self, query: str, num_results: int = 3) -> Dict[str, Any]:
-        """Search for shopping results with images and links"""
+    def _shopping_page_params(self, query: str, page: int) -> Dict[str, Any]:
+        return {
+            'q': query,
+            'cx': self.search_engine_id,
+            'num': RESULTS_PER_PAGE,
+            'start': 1 + page * RESULTS_PER_PAGE,
+        }
+
+    def _to_alternative(self, item: Dict[str, Any], lexicon) -> Optional[Dict[str, Any]]:
+        """An alternative for a store result, None for anything else"""
+        title = item.get('title', 'Product')
+        link = item.get('link', '')
+        snippet = item.get('snippet', '')
+        
+        # Filter out non-shopping sites
+        classification = lexicon.classify(link, title)
+        if not classification["store"]:
+            logger.info(f"Filtered out non-store result: {link}")
+            return None
+        
+        # Try to get image from pagemap
+        image_url = ""
+        pagemap = item.get('pagemap', {})
+        if 'cse_image' in pagemap and len(pagemap['cse_image']) > 0:
+            image_url = pagemap['cse_image'][0].get('src', '')
+        elif 'cse_thumbnail' in pagemap and len(pagemap['cse_thumbnail']) > 0:
+            image_url = pagemap['cse_thumbnail'][0].get('src', '')
+        
+        return {
+            "name": title[:100],  # Limit title length
+            "brand": classification["brand"] or self._brand_from_domain(link),
+            "image_url": image_url,
+            "sustainability_score": 4.0,  # Default score for sustainable search results
+            "link": link,
+            "why_sustainable": snippet[:200] if snippet else "Sustainable alternative found through eco-friendly search"
+        }
+
+    async def search_shopping_results(self, query: str, num_results: int = 3,
+                                      max_pages: int = settings.SEARCH_MAX_PAGES) -> Dict[str, Any]:
+        """Search for shopping results with images and links
+
+        Result pages (10 results each, via ``start``) are requested ahead of
+        need, SEARCH_SPECULATIVE_PAGES at a time, and consumed in rank order;
+        the search stops as soon as ``num_results`` stores are found or the
+        results run out, cancelling pages still in flight. At most
+        ``max_pages`` requests are made (pages are never hedged or retried),
+        which caps the quota one analysis can spend. A failure after the first page keeps what was found.
+        """
+        max_pages = max(1, min(max_pages, MAX_RESULT_PAGES))
+        alternatives: List[Dict[str, Any]] = []
+        examined = 0
+        consumed = 0
+        window = max(1, settings.SEARCH_SPECULATIVE_PAGES)
+        pages: List[asyncio.Task] = []
+        requested = 0
+
+        async def fetch_page(page: int) -> Dict[str, Any]:
+            nonlocal requested
+            requested += 1  # Pages cancelled before they start never reach the API
+            return await self._execute(self._shopping_page_params(query, page), hedge=False, retry=False)
+
+        def request_next_page() -> None:
+            pages.append(asyncio.create_task(fetch_page(len(pages))))
+
         try:
             logger.info(f"Searching for shopping results: {query}")
+            lexicon = get_search_lexicon()
+            for _ in range(min(window, max_pages)):
+                request_next_page()
             
-            # Search for more results than needed so we can filter
-            search_params = {
-                'q': query,
-                'cx': self.search_engine_id,
-                'num': 10,  # Get more results to filter
-            }
-            
-            result = self.service.cse().list(**search_params).execute()
-            search_results = result.get('items', [])
-            
-            # Parse results into a clean format
-            alternatives = []
-            for item in search_results:
-                title = item.get('title', 'Product')
-                link = item.get('link', '')
-                snippet = item.get('snippet', '')
-                
-                # Filter out non-shopping sites
-                if not self._is_valid_clothing_store(link, title):
-                    logger.info(f"Filtered out non-store result: {link}")
-                    continue
-                
-                # Try to get image from pagemap
-                image_url = ""
-                pagemap = item.get('pagemap', {})
-                if 'cse_image' in pagemap and len(pagemap['cse_image']) > 0:
-                    image_url = pagemap['cse_image'][0].get('src', '')
-                elif 'cse_thumbnail' in pagemap and len(pagemap['cse_thumbnail']) > 0:
-                    image_url = pagemap['cse_thumbnail'][0].get('src', '')
-                
-                # Extract brand from title or link
-                brand = self._extract_brand_from_text(title + " " + link)
+            seen_links = set()
+            while consumed < len(pages):
+                try:
+                    result = await pages[consumed]
+                except Exception as e:
+                    if consumed == 0:
+                        raise
+                    logger.warning(f"Shopping search page {consumed + 1} failed, keeping earlier pages: {str(e)}")
+                    break
+                consumed += 1
                 
-                alternative = {
-                    "name": title[:100],  # Limit title length
-                    "brand": brand,
-                    "image_url": image_url,
-                    "sustainability_score": 4.0,  # Default score for sustainable search results
-                    "link": link,
-                    "why_sustainable": snippet[:200] if snippet else "Sustainable alternative found through eco-friendly search"
-                }
-                alternatives.append(alternative)
+                search_results = result.get('items', [])
+                for item in search_results:
+                    examined += 1
+                    alternative = self._to_alternative(item, lexicon)
+                    if alternative is None or alternative["link"] in seen_links:
+                        continue
+                    seen_links.add(alternative["link"])
+                    alternatives.append(alternative)
+                    if len(alternatives) >= num_results:
+                        break
                 
-                # Stop once we have enough valid results
+                # Stop once we have enough valid results, or there are no more
                 if len(alternatives) >= num_results:
+                    if consumed < len(pages):
+                        metrics.increment("search.early_stops")
                     break
+                if len(search_results) < RESULTS_PER_PAGE or not result.get('queries', {}).get('nextPage', True):
+                    break
+                if len(pages) < max_pages:
+                    request_next_page()
             
-            logger.info(f"Found {len(alternatives)} valid shopping alternatives after filtering")
+            logger.info(f"Found {len(alternatives)} valid shopping alternatives after filtering "
+                        f"{examined} results from {consumed}/{len(pages)} pages")
             return {
                 "success": True,
                 "alternatives": alternatives
@@ -186,80 +261,22 @@ class GoogleSearchService:
                 "error": f"Shopping search failed: {str(e)}",
                 "alternatives": []
             }
+        finally:
+            # Drop speculative pages nobody needs (and collect their errors)
+            for page in pages:
+                page.cancel()
+            await asyncio.gather(*pages, return_exceptions=True)
+            metrics.observe("search.pages_per_query", requested)
+            metrics.observe("search.pages_consumed", consumed)
+            if examined:
+                metrics.observe("search.filter_yield", len(alternatives) / examined)
     
-    def _is_valid_clothing_store(self, url: str, title: str) -> bool:
-        """Check if the URL is from a valid clothing store"""
-        url_lower = url.lower()
-        title_lower = title.lower()
-        
-        # Blacklist - sites to exclude
-        blacklist = [
-            'reddit.com', 'facebook.com', 'twitter.com', 'instagram.com',
-            'pinterest.com', 'youtube.com', 'tiktok.com',
-            'wikipedia.org', 'wiki', 'blog', 'forum',
-            'news', 'article', 'review-site', 'comparison'
-        ]
-        
-        for blocked in blacklist:
-            if blocked in url_lower:
-                return False
-        
-        # Whitelist - known clothing/fashion stores
-        clothing_stores = [
-            'patagonia.com', 'tentree.com', 'everlane.com', 'reformation.com',
-            'outerknown.com', 'allbirds.com', 'girlfriend.com', 'wearpact.com',
-            'kotn.com', 'thought', 'peopletree.co', 'organicbasics.com',
-            'armedangels.com', 'nudiejeans.com', 'veja-store.com',
-            'etsy.com', 'fairindigo.com', 'alternativeapparel.com',
-            'shop', 'store', 'buy', 'clothing', 'apparel', 'fashion',
-            'wear', 'garment', 'outfit', 'dress', 'shirt', 'pants',
-            'product', 'item', 'collection'
-        ]
-        
-        # Check if URL or title contains clothing-related keywords
-        for store_keyword in clothing_stores:
-            if store_keyword in url_lower or store_keyword in title_lower:
-                return True
-        
-        # Additional check: if title mentions clothing items
-        clothing_items = [
-            'shirt', 't-shirt', 'tee', 'top', 'blouse', 'sweater', 'hoodie',
-            'jacket', 'coat', 'pants', 'jeans', 'shorts', 'skirt', 'dress',
-            'shoes', 'sneakers', 'boots', 'socks', 'underwear', 'bra',
-            'hat', 'cap', 'scarf', 'gloves', 'belt', 'bag'
-        ]
-        
-        for item in clothing_items:
-            if item in title_lower:
-                return True
-        
-        return False
-    
-    def _extract_brand_from_text(self, text: str) -> str:
-        """Extract brand name from text"""
-        text_lower = text.lower()
-        
-        # List of sustainable brands to look for
-        sustainable_brands = [
-            'patagonia', 'tentree', 'everlane', 'reformation', 'outerknown',
-            'allbirds', 'girlfriend collective', 'pact', 'kotn', 'thought',
-            'people tree', 'organic basics', 'armedangels', 'nudie jeans',
-            'veja', 'etsy', 'fair indigo', 'alternative apparel'
-        ]
-        
-        for brand in sustainable_brands:
-            if brand in text_lower:
-                return brand.title()
-        
-        # If no sustainable brand found, try to extract from domain
-        if 'http' in text_lower:
-            try:
-                domain = text_lower.split('//')[1].split('/')[0]
-                domain = domain.replace('www.', '').replace('.com', '').replace('.org', '')
-                return domain.title()
-            except:
-                pass
-        
+    def _brand_from_domain(self, link: str) -> str:
+        """Fallback brand for a store the lexicon doesn't know: its domain name"""
+        host = urlsplit(link.lower()).hostname or ""
+        if host:
+            domain = host.replace('www.', '').replace('.com', '').replace('.org', '')
+            return domain.title()
         return "Sustainable Brand"
 
 google_search_service = GoogleSearchService()
@@ -0,0 +1,179 @@
+"""
+Perceptual-hash index used to spot re-uploads of the same garment photo
+"""
+import asyncio
+import itertools
+import logging
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from config import settings
+from database import USER_CLOTHING_INDEX, dynamodb_service
+from services.metrics import metrics
+from services.ttl_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+USER_INDEX_TTL_SECONDS = 3600
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: one bit per horizontally adjacent pixel pair
+
+    Robust to re-encoding, resizing and small exposure changes, so two shots
+    of the same photo end up a few bits apart.
+    """
+    small = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHashIndex:
+    """Near-neighbour search over 64-bit hashes by multi-index hashing
+
+    Each hash is split into ``chunks`` substrings, each with its own bucket
+    table. If two hashes are within ``max_distance`` bits, at least one chunk
+    differs by at most ``max_distance // chunks`` bits. Probing each table
+    with that small radius gives a few dozen bucket lookups per query, even
+    with millions of entries. Hashes live in a flat ``array('Q')`` and buckets
+    in ``array('I')``; payloads are ordinary Python objects.
+    """
+
+    def __init__(self, max_distance: int, chunks: int = 4):
+        if 64 % chunks:
+            raise ValueError("chunks must divide 64")
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self.bits_per_chunk = 64 // chunks
+        self._chunk_mask = (1 << self.bits_per_chunk) - 1
+        chunk_radius = max_distance // chunks
+        self._probe_masks = [
+            sum(1 << bit for bit in bits)
+            for radius in range(chunk_radius + 1)
+            for bits in itertools.combinations(range(self.bits_per_chunk), radius)
+        ]
+        self._hashes = array("Q")
+        self._payloads: List[Any] = []
+        self._tables: List[Dict[int, array]] = [{} for _ in range(chunks)]
+
+    def _split(self, value: int) -> List[int]:
+        return [(value >> (i * self.bits_per_chunk)) & self._chunk_mask for i in range(self.chunks)]
+
+    def add(self, value: int, payload: Any) -> None:
+        position = len(self._hashes)
+        self._hashes.append(value)
+        self._payloads.append(payload)
+        for table, chunk in zip(self._tables, self._split(value)):
+            bucket = table.get(chunk)
+            if bucket is None:
+                bucket = table[chunk] = array("I")
+            bucket.append(position)
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """Return ``(distance, payload)`` pairs within ``max_distance``, closest first"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        seen = set()
+        matches = []
+        for table, chunk in zip(self._tables, self._split(value)):
+            for mask in self._probe_masks:
+                for position in table.get(chunk ^ mask, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = hamming_distance(self._hashes[position], value)
+                    if distance <= max_distance:
+                        matches.append((distance, self._payloads[position]))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+class ImageDedupIndex:
+    """Maps image hashes to the clothing item and report of earlier analyses
+
+    Matches are scoped to the uploading user, so each user gets their own
+    index. It's loaded on the user's first upload by a query on the clothing
+    table's user_id GSI (only hash and ids projected), not by a table scan at
+    startup, and kept in an LRU of IMAGE_DEDUP_MAX_USERS users for
+    USER_INDEX_TTL_SECONDS so uploads made through other replicas show up.
+    """
+
+    def __init__(self, max_distance: int = settings.IMAGE_DEDUP_MAX_DISTANCE,
+                 max_users: int = settings.IMAGE_DEDUP_MAX_USERS):
+        self.max_distance = max_distance
+        self._users = LRUCache(max_users, USER_INDEX_TTL_SECONDS)
+        # user_id -> load in progress, so concurrent uploads share one query
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    async def _load(self, user_id: str) -> MultiIndexHashIndex:
+        result = await dynamodb_service.query_all(
+            "user_id = :user_id",
+            {":user_id": user_id},
+            index_name=USER_CLOTHING_INDEX,
+            fields=["clothing_id", "image_hash", "report_id"]
+        )
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        index = MultiIndexHashIndex(self.max_distance)
+        for item in result["items"]:
+            if item.get("image_hash") and item.get("report_id"):
+                index.add(int(item["image_hash"], 16), (item["clothing_id"], item["report_id"]))
+        metrics.increment("image_index.user_loads")
+        return index
+
+    async def _user_index(self, user_id: str) -> MultiIndexHashIndex:
+        index = self._users.get(user_id)
+        if index is not None:
+            return index
+        task = self._loading.get(user_id)
+        if task is None:
+            task = self._loading[user_id] = asyncio.create_task(self._load(user_id))
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        index = await asyncio.shield(task)
+        self._users.set(user_id, index)
+        return index
+
+    def add(self, image_hash: int, user_id: str, clothing_id: str, report_id: str) -> None:
+        """Record a new analysis in the user's index if it's loaded (else the next load reads it)"""
+        index = self._users.get(user_id)
+        if index is not None:
+            index.add(image_hash, (clothing_id, report_id))
+        task = self._loading.get(user_id)
+        if task is not None:
+            # The query may have run before this item was written
+            task.add_done_callback(
+                lambda done: done.cancelled() or done.exception() is not None
+                or done.result().add(image_hash, (clothing_id, report_id))
+            )
+
+    async def find(self, image_hash: int, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's closest earlier upload within max_distance, or None"""
+        try:
+            index = await self._user_index(user_id)
+        except Exception as e:
+            # Dedup is an optimisation; without the index the upload is just analysed
+            logger.warning(f"Failed to load image hashes for user {user_id}: {str(e)}")
+            return None
+        matches = index.search(image_hash)
+        if not matches:
+            return None
+        distance, (clothing_id, report_id) = matches[0]
+        return {"clothing_id": clothing_id, "report_id": report_id, "distance": distance}
+
+
+image_dedup_index = ImageDedupIndex()
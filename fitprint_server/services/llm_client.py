@@ -0,0 +1,126 @@
+"""
+Shared async Gemini client with bounded concurrency
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from config import settings
+from services.metrics import metrics
+from services.resilience import circuit_breaker, hedged, within
+
+logger = logging.getLogger(__name__)
+
+
+def is_llm_outage(error: BaseException) -> bool:
+    """Breaker predicate: rate limits, server errors and timeouts count, bad requests don't"""
+    # Imported here: it pulls in grpc, which isn't needed until a call fails
+    from google.api_core import exceptions as api_exceptions
+
+    if isinstance(error, api_exceptions.TooManyRequests):
+        return True
+    return not isinstance(error, (api_exceptions.ClientError, ValueError))
+
+
+class LLMClient:
+    """Non-blocking wrapper around the Gemini SDK used by every Gemini service
+
+    Calls go through the SDK's async API so they never block the event loop,
+    and a semaphore caps how many are in flight at once. Callers beyond the
+    cap queue up; queue depth, in-flight count, wait times and token usage
+    are published to ``services.metrics``.
+
+    Each request is limited to LLM_TIMEOUT_SECONDS (or less if the request's
+    deadline is closer), hedged after LLM_HEDGE_AFTER_SECONDS once it holds
+    a slot, and rejected up front while the Gemini circuit breaker is open.
+
+    The SDK (about half a second to import) is loaded and configured on the
+    first call rather than at startup.
+    """
+
+    def __init__(self, max_in_flight: int = settings.GEMINI_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._genai = None
+        self._models: Dict[str, Any] = {}
+        self._in_flight = 0
+        self._waiting = 0
+        self.breaker = circuit_breaker("gemini", is_failure=is_llm_outage)
+        metrics.set_gauge("llm.max_in_flight", max_in_flight)
+        self._publish_gauges()
+
+    def get_model(self, model_name: str) -> Any:
+        """Return a cached ``genai.GenerativeModel``"""
+        model = self._models.get(model_name)
+        if model is None:
+            if self._genai is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                self._genai = genai
+            model = self._genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+
+    async def generate(self, contents: Any, model_name: str = "gemini-2.5-flash", **kwargs) -> Any:
+        """Run ``generate_content_async`` once a concurrency slot is free
+
+        Only the request itself is hedged: a call still queued for a slot
+        never sends a backup, and the queue wait is bounded by the request's
+        deadline (asyncio.TimeoutError once it passes).
+        """
+        await self._acquire_slot()
+        started = time.perf_counter()
+        self._in_flight += 1
+        self._publish_gauges()
+        try:
+            response = await hedged(
+                lambda: self.breaker.call(lambda: within(
+                    self.get_model(model_name).generate_content_async(contents, **kwargs),
+                    settings.LLM_TIMEOUT_SECONDS
+                )),
+                settings.LLM_HEDGE_AFTER_SECONDS,
+                name="llm",
+                should_retry=is_llm_outage
+            )
+            metrics.increment("llm.requests")
+            self._record_usage(response)
+            return response
+        except Exception:
+            metrics.increment("llm.errors")
+            raise
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+            self._publish_gauges()
+            metrics.observe("llm.latency_ms", (time.perf_counter() - started) * 1000)
+
+    async def _acquire_slot(self) -> None:
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        self._publish_gauges()
+        try:
+            await within(self._semaphore.acquire(), None)
+        except asyncio.TimeoutError:
+            metrics.increment("llm.queue_timeouts")
+            raise
+        finally:
+            self._waiting -= 1
+            self._publish_gauges()
+        metrics.observe("llm.queue_wait_ms", (time.perf_counter() - queued_at) * 1000)
+
+    def _record_usage(self, response: Any) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        metrics.increment("llm.prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+        metrics.increment("llm.output_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+        metrics.increment("llm.total_tokens", getattr(usage, "total_token_count", 0) or 0)
+
+    def _publish_gauges(self) -> None:
+        metrics.set_gauge("llm.in_flight", self._in_flight)
+        metrics.set_gauge("llm.queue_depth", self._waiting)
+
+
+llm_client = LLMClient()
@@ -0,0 +1,191 @@
+"""
+Structured (JSON) Gemini output: response schemas from our Pydantic models and
+one tolerant parser for whatever text comes back
+"""
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from services.llm_client import llm_client
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# JSON Schema keywords Gemini's response_schema doesn't accept
+_UNSUPPORTED_SCHEMA_KEYS = {"title", "default", "examples", "additionalProperties", "$defs", "definitions"}
+
+_decoder = json.JSONDecoder()
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no JSON value can be recovered from a model response"""
+
+
+def _inline_schema(node: Any, definitions: Dict[str, Any]) -> Any:
+    if isinstance(node, list):
+        return [_inline_schema(item, definitions) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    if "$ref" in node:
+        return _inline_schema(definitions[node["$ref"].split("/")[-1]], definitions)
+
+    # Optional[X] comes out as anyOf [X, null]; Gemini wants X with nullable
+    variants = node.get("anyOf")
+    if variants is not None:
+        non_null = [variant for variant in variants if variant.get("type") != "null"]
+        if len(non_null) == 1:
+            inlined = _inline_schema(non_null[0], definitions)
+            if len(non_null) < len(variants):
+                inlined["nullable"] = True
+            return inlined
+
+    return {
+        key: _inline_schema(value, definitions)
+        for key, value in node.items()
+        if key not in _UNSUPPORTED_SCHEMA_KEYS
+    }
+
+
+@lru_cache(maxsize=None)
+def response_schema_for(schema_type: Any) -> Dict[str, Any]:
+    """Gemini ``response_schema`` for a Pydantic model or type such as List[Model]
+
+    Gemini accepts an OpenAPI subset: no ``$ref``, ``title``, ``default`` or
+    ``anyOf``, so references are inlined and unsupported keywords dropped.
+    """
+    schema = TypeAdapter(schema_type).json_schema()
+    return _inline_schema(schema, schema.get("$defs", {}))
+
+
+def json_generation_config(schema_type: Any) -> Dict[str, Any]:
+    """generation_config asking Gemini for JSON that matches ``schema_type``"""
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": response_schema_for(schema_type)
+    }
+
+
+def _strip_fences(text: str) -> str:
+    if not text.startswith("```"):
+        return text
+    # Drop the opening fence line (``` or ```json) and anything after a closing fence
+    text = text.split("\n", 1)[1] if "\n" in text else ""
+    closing = text.rfind("```")
+    return text[:closing] if closing != -1 else text
+
+
+def _truncation_repairs(fragment: str) -> Iterator[Any]:
+    """Best-effort parses of a JSON value cut off mid-way (e.g. at max tokens)
+
+    Closes the open brackets as-is only when the fragment stops right after a
+    complete element; a half-written string or bare scalar ('"Ni', '4' of
+    '4.5') might read as valid but wrong, so it is dropped. Then backs off
+    to each earlier element boundary, dropping the half-written element.
+    """
+    closers: List[str] = []
+    boundaries = []
+    in_string = escaped = False
+    for position, char in enumerate(fragment):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if closers:
+                closers.pop()
+            boundaries.append((position + 1, "".join(reversed(closers))))
+        elif char == ",":
+            boundaries.append((position, "".join(reversed(closers))))
+
+    candidates = []
+    cut_mid_value = in_string or fragment[-1:].isalnum() or fragment[-1:] in ".+-"
+    if not cut_mid_value:
+        candidates.append(fragment.rstrip().rstrip(",") + "".join(reversed(closers)))
+    candidates += [fragment[:position] + closing for position, closing in reversed(boundaries[-20:])]
+    for candidate in candidates:
+        try:
+            yield json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+
+
+def _json_candidates(text: str, expect: type = object) -> Iterator[Tuple[Any, bool]]:
+    """Yield ``(value, repaired)`` for each plausible reading of ``text``, best first"""
+    text = _strip_fences((text or "").strip()).strip()
+    try:
+        yield json.loads(text), False
+        return
+    except json.JSONDecodeError:
+        pass
+
+    openers = {dict: "{", list: "["}.get(expect, "{[")
+    starts = [position for position in (text.find(opener) for opener in openers) if position != -1]
+    if not starts:
+        return
+    start = min(starts)
+
+    try:
+        # raw_decode stops at the end of the value, ignoring trailing prose
+        yield _decoder.raw_decode(text, start)[0], False
+        return
+    except json.JSONDecodeError:
+        pass
+
+    for value in _truncation_repairs(text[start:]):
+        yield value, True
+
+
+def parse_model_output(text: str, schema_type: Any, purpose: str) -> Any:
+    """Parse a model response and validate it against ``schema_type``
+
+    Truncated output can be repaired several ways, so each candidate is
+    validated in turn and the first valid one wins. Every call is observed
+    as ``llm.json_parse_failed`` (and ``llm.json_parse_failed.<purpose>``)
+    with 1 on failure and 0 on success, so the summary's ``avg`` is the
+    parse-failure rate.
+    """
+    adapter = TypeAdapter(schema_type)
+    expect = list if getattr(schema_type, "__origin__", None) is list else dict
+    error: Exception = JSONExtractionError(f"No JSON found in model response: {(text or '')[:200]!r}")
+    for value, repaired in _json_candidates(text, expect):
+        try:
+            parsed = adapter.validate_python(value)
+        except ValidationError as e:
+            error = e
+            continue
+        if repaired:
+            metrics.increment("llm.json_repaired")
+            logger.warning(f"Recovered truncated JSON from {purpose} response")
+        metrics.observe("llm.json_parse_failed", 0)
+        metrics.observe(f"llm.json_parse_failed.{purpose}", 0)
+        return parsed
+
+    metrics.observe("llm.json_parse_failed", 1)
+    metrics.observe(f"llm.json_parse_failed.{purpose}", 1)
+    raise error
+
+
+async def generate_json(contents: Any, schema_type: Any, purpose: str,
+                        model_name: str = "gemini-2.5-flash") -> Any:
+    """Ask Gemini for JSON matching ``schema_type`` and return it validated
+
+    ``schema_type`` is a Pydantic model (or e.g. List[Model]); the result is
+    an instance of it. Raises if the response can't be parsed or validated.
+    """
+    response = await llm_client.generate(
+        contents,
+        model_name=model_name,
+        generation_config=json_generation_config(schema_type)
+    )
+    return parse_model_output(response.text, schema_type, purpose)
@@ -0,0 +1,135 @@
+"""
+Coalesced sign-in bookkeeping for the users table
+
+Clients re-authenticate on every app foreground, and each sign-in used to
+rewrite the whole profile. Now the profile is written only when Google's
+claims differ from what this process last stored, and ``last_login`` /
+``login_count`` updates are buffered per user and flushed periodically
+(and on shutdown) as one small UpdateItem per user.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from config import settings
+from database import dynamodb_service
+from services.metrics import metrics
+from services.resilience import CircuitOpenError
+from services.ttl_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Claims copied into the stored profile
+PROFILE_FIELDS = {"email": "email", "full_name": "name", "picture": "picture"}
+
+
+def profile_digest(claims: Dict[str, Any]) -> str:
+    """Digest of the profile fields a sign-in would write"""
+    profile = {field: claims.get(claim) for field, claim in PROFILE_FIELDS.items()}
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LoginActivityBuffer:
+    """Remembers stored profiles and batches login bookkeeping writes"""
+
+    def __init__(self, flush_interval: float = settings.LOGIN_FLUSH_INTERVAL_SECONDS,
+                 max_profiles: int = 10000):
+        self.flush_interval = flush_interval
+        # user_id -> digest of the profile this process knows is stored
+        self._stored_profiles = LRUCache(max_profiles, ttl_seconds=24 * 3600)
+        # user_id -> {"last_login": latest ISO timestamp, "count": logins not yet written}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def profile_is_stored(self, user_id: str, digest: str) -> bool:
+        return self._stored_profiles.get(user_id) == digest
+
+    def mark_profile_stored(self, user_id: str, digest: str) -> None:
+        self._stored_profiles.set(user_id, digest)
+
+    def take_pending(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Remove and return a user's buffered logins (to fold into a full write)"""
+        pending = self._pending.pop(user_id, None)
+        metrics.set_gauge("auth.pending_logins", len(self._pending))
+        return pending
+
+    def restore_pending(self, user_id: str, pending: Optional[Dict[str, Any]]) -> None:
+        """Put back logins taken for a write that failed, behind any recorded since"""
+        if not pending:
+            return
+        current = self._pending.setdefault(user_id, {"last_login": pending["last_login"], "count": 0})
+        current["last_login"] = max(current["last_login"], pending["last_login"])
+        current["count"] += pending["count"]
+        metrics.set_gauge("auth.pending_logins", len(self._pending))
+
+    def record_login(self, user_id: str, last_login: str) -> None:
+        self._ensure_started()
+        pending = self._pending.setdefault(user_id, {"last_login": last_login, "count": 0})
+        pending["last_login"] = max(pending["last_login"], last_login)
+        pending["count"] += 1
+        metrics.increment("auth.profile_writes_skipped")
+        metrics.set_gauge("auth.pending_logins", len(self._pending))
+
+    def _ensure_started(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _write(self, user_id: str, pending: Dict[str, Any]) -> None:
+        # Only touch existing rows so a deleted user isn't recreated as a stub
+        await dynamodb_service.call_table(
+            "users",
+            "update_item",
+            Key={"user_id": user_id},
+            UpdateExpression="SET last_login = :last_login ADD login_count :count",
+            ConditionExpression="attribute_exists(user_id)",
+            ExpressionAttributeValues={":last_login": pending["last_login"], ":count": pending["count"]},
+        )
+
+    async def flush(self) -> int:
+        """Write every buffered login; failed users stay buffered for the next flush"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        user_ids = list(batch)
+        results: List[Any] = await asyncio.gather(
+            *(self._write(user_id, batch[user_id]) for user_id in user_ids), return_exceptions=True
+        )
+
+        written = 0
+        for user_id, result in zip(user_ids, results):
+            if result is None:
+                written += 1
+                continue
+            if isinstance(result, ClientError) and result.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                # The user row is gone; nothing to count logins against
+                self._stored_profiles.delete(user_id)
+                continue
+            if not isinstance(result, (ClientError, CircuitOpenError)):
+                logger.error(f"Unexpected error flushing logins for {user_id}: {result}")
+            # Merge back behind anything recorded while this flush ran
+            self.restore_pending(user_id, batch[user_id])
+
+        metrics.increment("auth.login_flush_writes", written)
+        metrics.set_gauge("auth.pending_logins", len(self._pending))
+        if written < len(user_ids):
+            logger.warning(f"Flushed logins for {written}/{len(user_ids)} users; the rest will be retried")
+        return written
+
+    async def shutdown(self) -> None:
+        """Stop the periodic flush and write whatever is still buffered"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+
+login_activity = LoginActivityBuffer()
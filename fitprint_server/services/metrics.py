@@ -0,0 +1,49 @@
+"""
+Process-local metrics exposed by the /metrics endpoint
+"""
+import threading
+from typing import Any, Dict
+
+
+class Metrics:
+    """Thread-safe counters, gauges and simple timing summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add ``value`` to a monotonically increasing counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Record the current value of something that goes up and down"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Track count, total and max of a measured value (e.g. a latency)"""
+        with self._lock:
+            summary = self._summaries.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["total"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serialisable copy of every metric"""
+        with self._lock:
+            summaries = {
+                name: {**summary, "avg": summary["total"] / summary["count"] if summary["count"] else 0.0}
+                for name, summary in self._summaries.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": summaries
+            }
+
+
+metrics = Metrics()
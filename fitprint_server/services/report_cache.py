@@ -0,0 +1,73 @@
+"""
+Sustainability report cache keyed on normalized brand and product type
+"""
+import re
+from typing import Any, Dict, Optional
+
+from config import settings
+from services.ttl_cache import TwoTierCache
+
+# Synonyms map onto one canonical product type
+PRODUCT_TYPES = {
+    "t-shirt": ["t-shirt", "t shirt", "tshirt", "tee"],
+    "sweatshirt": ["sweatshirt", "crewneck"],
+    "hoodie": ["hoodie", "hoody", "hooded"],
+    "polo": ["polo"],
+    "shirt": ["shirt", "button-down", "button down", "flannel"],
+    "blouse": ["blouse"],
+    "tank top": ["tank top", "tank", "camisole"],
+    "sweater": ["sweater", "cardigan", "jumper", "pullover"],
+    "jacket": ["jacket", "windbreaker", "parka", "puffer", "fleece"],
+    "coat": ["coat", "trench"],
+    "jeans": ["jeans", "denim"],
+    "leggings": ["leggings", "tights"],
+    "pants": ["pants", "trousers", "chinos", "joggers", "sweatpants"],
+    "shorts": ["shorts"],
+    "skirt": ["skirt"],
+    "dress": ["dress", "gown"],
+    "sneakers": ["sneakers", "trainers", "running shoes"],
+    "boots": ["boots"],
+    "shoes": ["shoes", "loafers", "sandals", "heels"],
+    "hat": ["hat", "cap", "beanie"],
+    "bag": ["bag", "backpack", "tote", "purse"],
+    "top": ["top"],
+}
+
+_PRODUCT_TYPE_PATTERNS = [
+    (re.compile(r"\b" + re.escape(synonym) + r"s?\b"), product_type)
+    for product_type, synonyms in PRODUCT_TYPES.items()
+    for synonym in sorted(synonyms, key=len, reverse=True)
+]
+_NON_WORD = re.compile(r"[^a-z0-9&]+")
+_CORPORATE_SUFFIX = re.compile(r"( (inc|co|corp|ltd|llc|gmbh))+$")
+
+
+def normalize_brand(brand: Optional[str]) -> str:
+    """'  Nike, Inc. ' -> 'nike'; 'H&M' stays 'h&m'"""
+    normalized = _NON_WORD.sub(" ", (brand or "").lower()).strip()
+    return _CORPORATE_SUFFIX.sub("", normalized) or "unknown"
+
+
+def normalize_product_type(product_info: Dict[str, Any]) -> str:
+    """Map a free-text product title/description onto a canonical garment type"""
+    for field in ("product_title", "product_description"):
+        text = (product_info.get(field) or "").lower()
+        # The garment noun usually comes last ("denim jacket", "running shoes"),
+        # so the latest mention wins, and the longest one on ties ("tank top")
+        matches = [(match.end(), match.end() - match.start(), product_type)
+                   for pattern, product_type in _PRODUCT_TYPE_PATTERNS
+                   for match in pattern.finditer(text)]
+        if matches:
+            return max(matches)[2]
+    return "clothing"
+
+
+def report_cache_key(brand: Optional[str], product_info: Dict[str, Any]) -> str:
+    return f"{normalize_brand(brand)}|{normalize_product_type(product_info)}"
+
+
+report_cache = TwoTierCache(
+    namespace="report",
+    max_entries=settings.REPORT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.REPORT_CACHE_TTL_SECONDS
+)
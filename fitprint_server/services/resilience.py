@@ -0,0 +1,235 @@
+"""
+Tail-latency controls for calls to external dependencies: a per-request
+deadline, hedged calls and circuit breakers
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+from botocore.exceptions import ClientError, ParamValidationError
+
+from config import settings
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Monotonic time by which the current request must finish. Tasks copy the
+# context when created, so every stage of an analysis sees its request's deadline.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+# AWS error codes that mean the service (not the request) is in trouble
+_AWS_THROTTLING_CODES = {
+    "ProvisionedThroughputExceededException", "ThrottlingException", "Throttling",
+    "RequestLimitExceeded", "SlowDown", "ServiceUnavailable", "InternalServerError", "InternalError"
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+
+def is_aws_outage(error: BaseException) -> bool:
+    """Breaker predicate for boto3 calls: throttling, 5xx and network errors count
+
+    Errors caused by the request itself (validation, conditional checks,
+    missing keys) say nothing about the service's health.
+    """
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return status_code >= 500 or code in _AWS_THROTTLING_CODES
+    return not isinstance(error, (ParamValidationError, ValueError, TypeError))
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Give the enclosed work (and tasks it starts) ``seconds`` to finish
+
+    A deadline never extends an outer one that ends sooner.
+    """
+    expires_at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(expires_at if outer is None else min(outer, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none"""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return max(0.0, expires_at - time.monotonic())
+
+
+def budget(timeout: Optional[float]) -> Optional[float]:
+    """The smaller of ``timeout`` and the time left before the deadline"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if timeout is None:
+        return left
+    return min(timeout, left)
+
+
+async def within(awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+    """Await ``awaitable`` for at most ``budget(timeout)`` seconds
+
+    Raises asyncio.TimeoutError when that slice runs out (immediately if the
+    deadline has already passed).
+    """
+    seconds = budget(timeout)
+    if seconds is not None and seconds <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise asyncio.TimeoutError("Deadline exceeded")
+    return await asyncio.wait_for(awaitable, seconds)
+
+
+async def hedged(call: Callable[[], Awaitable[T]], hedge_after: float, name: str, attempts: int = 2,
+                 should_retry: Callable[[BaseException], bool] = lambda error: True) -> T:
+    """Run ``call`` and start a backup copy if it's slow or fails fast
+
+    A second attempt starts once the first has taken ``hedge_after`` seconds
+    (or right away if it fails with an error ``should_retry`` accepts), and
+    whichever succeeds first wins; the rest are cancelled. Only use it for
+    idempotent calls. ``hedge_after <= 0`` disables hedging. Counted as
+    ``<name>.hedges`` / ``<name>.retries``.
+    """
+    if hedge_after <= 0 or attempts < 2:
+        return await call()
+
+    pending = {asyncio.ensure_future(call())}
+    launched = 1
+    last_error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=hedge_after if launched < attempts else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                pending.add(asyncio.ensure_future(call()))
+                launched += 1
+                metrics.increment(f"{name}.hedges")
+                continue
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+            # Don't retry into an open circuit
+            if (not pending and launched < attempts
+                    and not isinstance(last_error, CircuitOpenError) and should_retry(last_error)):
+                pending.add(asyncio.ensure_future(call()))
+                launched += 1
+                metrics.increment(f"{name}.retries")
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class CircuitBreaker:
+    """Fail fast while a dependency is unhealthy
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls raise CircuitOpenError without touching the dependency. After
+    ``reset_seconds`` one trial call is let through: success closes the
+    circuit, failure opens it again. ``is_failure`` decides which exceptions
+    count against the dependency (e.g. not a conditional-check failure).
+    State is published as the ``breaker.<name>.open`` gauge.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = settings.BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = settings.BREAKER_RESET_SECONDS,
+                 is_failure: Callable[[BaseException], bool] = lambda error: True):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        metrics.set_gauge(f"breaker.{name}.open", 0)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def _before_call(self) -> bool:
+        """Raise if the call must be rejected; return True for a half-open trial"""
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        metrics.increment(f"breaker.{self.name}.rejected")
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Circuit breaker {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        metrics.set_gauge(f"breaker.{self.name}.open", 0)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit breaker {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            metrics.set_gauge(f"breaker.{self.name}.open", 1)
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        trial = self._before_call()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # Cancelled by a deadline or a winning hedge; says nothing about the dependency
+            raise
+        except asyncio.TimeoutError:
+            self.record_failure()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        else:
+            self.record_success()
+            return result
+        finally:
+            if trial:
+                self._trial_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(name: str, **kwargs: Any) -> CircuitBreaker:
+    """The process-wide breaker for dependency ``name`` (created on first use)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+    return breaker
+
+
+def breaker_states() -> Dict[str, str]:
+    return {name: breaker.state for name, breaker in _breakers.items()}
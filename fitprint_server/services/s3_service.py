@@ -1,7 +1,12 @@
+import asyncio
 import boto3
-from botocore.exceptions import ClientError
-from typing import Dict, Any, Optional
+import functools
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from typing import Dict, Any
 from config import settings
+from services.image_index import dhash
+from services.resilience import CircuitOpenError, circuit_breaker, is_aws_outage
 import uuid
 from datetime import datetime
 from PIL import Image
@@ -11,7 +16,12 @@ class S3Service:
     def __init__(self):
         # Initialize S3 client
         s3_kwargs = {
-            'region_name': settings.S3_REGION
+            'region_name': settings.S3_REGION,
+            'config': Config(
+                connect_timeout=settings.AWS_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=settings.AWS_READ_TIMEOUT_SECONDS,
+                retries={'max_attempts': 3, 'mode': 'standard'}
+            )
         }
 
         # Add credentials if provided
@@ -23,9 +33,15 @@ class S3Service:
 
         self.s3_client = boto3.client('s3', **s3_kwargs)
         self.bucket_name = settings.S3_BUCKET_NAME
+        self.breaker = circuit_breaker("s3", is_failure=is_aws_outage)
+
+    async def upload_image(self, file_content: bytes, user_id: str, original_filename: str = None,
+                           content_type: str = None) -> Dict[str, Any]:
+        """Upload an image to S3 and return the URL
 
-    async def upload_image(self, file_content: bytes, user_id: str, original_filename: str = None) -> Dict[str, Any]:
-        """Upload an image to S3 and return the URL"""
+        Pass ``content_type`` when ``file_content`` already went through
+        ``process_image`` so the upload doesn't decode and compress it again.
+        """
         try:
             # Generate unique filename
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -33,20 +49,27 @@ class S3Service:
             file_extension = original_filename.split('.')[-1] if original_filename and '.' in original_filename else 'jpg'
             filename = f"outfits/{user_id}/{timestamp}_{unique_id}.{file_extension}"
             
-            # Compress image if it's too large
-            processed_content = await self._process_image(file_content)
+            # Compress image if it's too large (skipped when the caller already did)
+            if content_type is None:
+                processed = await self.process_image(file_content)
+                processed_content = processed["content"]
+                content_type = processed["content_type"]
+            else:
+                processed_content = file_content
             
             # Upload to S3
             try:
-                self.s3_client.put_object(
+                # boto3 blocks, so keep it off the event loop
+                await self.breaker.call(lambda: asyncio.to_thread(
+                    self.s3_client.put_object,
                     Bucket=self.bucket_name,
                     Key=filename,
                     Body=processed_content,
-                    ContentType='image/jpeg'
-                )
+                    ContentType=content_type
+                ))
                 # Use real S3 URL
                 image_url = f"https://{self.bucket_name}.s3.{settings.S3_REGION}.amazonaws.com/{filename}"
-            except ClientError as e:
+            except (ClientError, BotoCoreError, CircuitOpenError) as e:
                 # Log the error and use fallback URL
                 print(f"S3 upload failed (using fallback URL): {str(e)}")
                 image_url = f"https://mock-s3-url.com/{self.bucket_name}/{filename}"
@@ -64,8 +87,18 @@ class S3Service:
                 "error": f"Image processing failed: {str(e)}"
             }
 
-    async def _process_image(self, file_content: bytes) -> bytes:
-        """Process and compress image if needed"""
+    async def process_image(self, file_content: bytes) -> Dict[str, Any]:
+        """Process and compress image if needed
+
+        Returns the bytes to store along with their MIME type, a 64-bit
+        perceptual hash (``image_hash``, None if decoding failed) used to
+        recognise re-uploads, and the smaller ``vision_content`` /
+        ``vision_content_type`` for Gemini Vision, all from a single decode.
+        """
+        # Decoding and re-encoding is CPU-bound, so run it in a worker thread
+        return await asyncio.to_thread(self._process_image, file_content)
+
+    def _process_image(self, file_content: bytes) -> Dict[str, Any]:
         try:
             # Open image with PIL
             image = Image.open(io.BytesIO(file_content))
@@ -82,11 +115,69 @@ class S3Service:
             # Save as JPEG with compression
             output = io.BytesIO()
             image.save(output, format='JPEG', quality=85, optimize=True)
-            return output.getvalue()
+            content = output.getvalue()
             
-        except Exception as e:
+            if settings.VISION_MAX_EDGE > 0:
+                vision_content = self.encode_vision_image(image)
+            else:
+                vision_content = content
+            
+            return {
+                "content": content,
+                "content_type": "image/jpeg",
+                "image_hash": dhash(image),
+                "vision_content": vision_content,
+                "vision_content_type": "image/jpeg"
+            }
+            
+        except Exception:
             # If processing fails, return original content
-            return file_content
+            content_type = self._guess_content_type(file_content)
+            return {
+                "content": file_content,
+                "content_type": content_type,
+                "image_hash": None,
+                "vision_content": file_content,
+                "vision_content_type": content_type
+            }
+
+    def encode_vision_image(self, image: Image.Image, max_edge: int = None, quality: int = None,
+                            crop: str = None, crop_fraction: float = None) -> bytes:
+        """JPEG derivative of a decoded image for brand identification
+
+        Logo and label recognition doesn't need full resolution, and image
+        tokens and upload bytes grow with it. Parameters default to the
+        VISION_* settings.
+        """
+        max_edge = max_edge or settings.VISION_MAX_EDGE
+        quality = quality or settings.VISION_JPEG_QUALITY
+        crop = crop or settings.VISION_CROP
+        crop_fraction = crop_fraction or settings.VISION_CROP_FRACTION
+        
+        width, height = image.size
+        crop_width, crop_height = int(width * crop_fraction), int(height * crop_fraction)
+        left = (width - crop_width) // 2
+        if crop == "center":
+            image = image.crop((left, (height - crop_height) // 2, left + crop_width, (height + crop_height) // 2))
+        elif crop == "label":
+            image = image.crop((left, 0, left + crop_width, crop_height))
+        else:
+            image = image.copy()
+        
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality)
+        return output.getvalue()
+
+    def _guess_content_type(self, file_content: bytes) -> str:
+        """Best-effort MIME type for content PIL could not re-encode"""
+        if file_content.startswith(b'\x89PNG'):
+            return 'image/png'
+        if file_content[:4] == b'RIFF' and file_content[8:12] == b'WEBP':
+            return 'image/webp'
+        if file_content[4:12] in (b'ftypheic', b'ftypheix', b'ftypmif1'):
+            return 'image/heic'
+        return 'image/jpeg'
 
     async def delete_image(self, filename: str) -> Dict[str, Any]:
         """Delete an image from S3"""
@@ -99,4 +190,14 @@ class S3Service:
         except ClientError as e:
             return {"success": False, "error": f"Failed to delete image: {str(e)}"}
 
-s3_service = S3Service()
+@functools.lru_cache(maxsize=None)
+def get_s3_service() -> S3Service:
+    """The process-wide S3Service, built on first use (creating the boto3 client takes ~0.2s)"""
+    return S3Service()
+
+
+def __getattr__(name: str):
+    # Keeps `from services.s3_service import s3_service` working for scripts
+    if name == "s3_service":
+        return get_s3_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
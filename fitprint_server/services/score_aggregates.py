@@ -0,0 +1,237 @@
+"""
+Materialized sustainability score statistics
+
+One item in the aggregates table holds the report count, score count/sum,
+min/max, the summary's distribution buckets and a 0.1-wide score histogram
+(scores run 0-5, so it's exact for one-decimal scores and gives percentiles).
+Creating or deleting a report adjusts it with an atomic ``ADD``, so
+/sustainability/scores/summary is a single GetItem. ``rebuild`` recomputes it
+from a parallel scan of every report.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+from database import dynamodb_service
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_ID = "sustainability_scores"
+HISTOGRAM_BINS = 51  # 0.0, 0.1, ... 5.0
+PERCENTILES = (25, 50, 75, 90)
+
+
+def score_bucket(score: float) -> str:
+    if score >= 4.0:
+        return "excellent"
+    if score >= 3.0:
+        return "good"
+    if score >= 2.0:
+        return "fair"
+    return "poor"
+
+
+def _histogram_bin(score: float) -> int:
+    return min(HISTOGRAM_BINS - 1, max(0, round(float(score) * 10)))
+
+
+def _score(report: Dict[str, Any]) -> Optional[Decimal]:
+    # Matches the old summary: reports without a (non-zero) score aren't scored
+    score = report.get("overall_score")
+    return Decimal(str(score)) if score else None
+
+
+def compute_deltas(reports: Iterable[Dict[str, Any]], sign: int = 1) -> Dict[str, Decimal]:
+    """Counter changes for adding (sign=1) or removing (sign=-1) reports"""
+    deltas: Dict[str, Decimal] = {}
+
+    def add(attribute: str, value: Decimal) -> None:
+        deltas[attribute] = deltas.get(attribute, Decimal(0)) + value * sign
+
+    for report in reports:
+        add("report_count", Decimal(1))
+        score = _score(report)
+        if score is None:
+            continue
+        add("score_count", Decimal(1))
+        add("score_sum", score)
+        add(f"bucket_{score_bucket(score)}", Decimal(1))
+        add(f"hist_{_histogram_bin(score):02d}", Decimal(1))
+    return deltas
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _histogram(aggregate: Dict[str, Any]) -> List[int]:
+    return [int(aggregate.get(f"hist_{i:02d}", 0)) for i in range(HISTOGRAM_BINS)]
+
+
+def _percentile(histogram: List[int], percentile: float) -> Optional[float]:
+    total = sum(histogram)
+    if total <= 0:
+        return None
+    rank = percentile / 100 * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if count and seen >= rank:
+            return i / 10
+    return (HISTOGRAM_BINS - 1) / 10
+
+
+class ScoreAggregates:
+    """Keeps the score statistics item in step with the reports table"""
+
+    def __init__(self, aggregate_id: str = AGGREGATE_ID):
+        self.key = {"aggregate_id": aggregate_id}
+
+    async def _add(self, deltas: Dict[str, Decimal]) -> Dict[str, Any]:
+        names = sorted(deltas)
+        response = await dynamodb_service.call_table(
+            "aggregates",
+            "update_item",
+            Key=self.key,
+            UpdateExpression="ADD " + ", ".join(f"{name} :d{i}" for i, name in enumerate(names))
+                             + " SET updated_at = :updated_at",
+            ExpressionAttributeValues={
+                **{f":d{i}": deltas[name] for i, name in enumerate(names)},
+                ":updated_at": datetime.now().isoformat() + "Z"
+            },
+            ReturnValues="ALL_NEW"
+        )
+        return response.get("Attributes", {})
+
+    async def _set_bound(self, attribute: str, value: Decimal, condition: Optional[str]) -> None:
+        """SET min_score/max_score, only if ``condition`` (on :v) still holds"""
+        kwargs: Dict[str, Any] = {}
+        if condition:
+            kwargs["ConditionExpression"] = f"attribute_not_exists({attribute}) OR {attribute} {condition} :v"
+        try:
+            await dynamodb_service.call_table(
+                "aggregates", "update_item", Key=self.key,
+                UpdateExpression=f"SET {attribute} = :v",
+                ExpressionAttributeValues={":v": value},
+                **kwargs
+            )
+        except ClientError as e:
+            # Another writer already stored a more extreme value
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    async def record(self, reports: List[Dict[str, Any]]) -> None:
+        """Count newly written reports (best effort; ``rebuild`` repairs drift)"""
+        if not reports:
+            return
+        try:
+            aggregate = await self._add(compute_deltas(reports))
+            scores = [score for score in map(_score, reports) if score is not None]
+            if not scores:
+                return
+            lowest, highest = min(scores), max(scores)
+            # The conditions make these safe against concurrent writers;
+            # checking the returned item first skips most of the writes
+            if "min_score" not in aggregate or aggregate["min_score"] > lowest:
+                await self._set_bound("min_score", lowest, ">")
+            if "max_score" not in aggregate or aggregate["max_score"] < highest:
+                await self._set_bound("max_score", highest, "<")
+        except Exception as e:  # bookkeeping only: never fail the write it follows
+            metrics.increment("aggregates.update_failures")
+            logger.error(f"Failed to update score aggregates: {str(e)}")
+
+    async def remove(self, reports: List[Dict[str, Any]]) -> None:
+        """Uncount deleted reports; min/max fall back to the histogram's bounds"""
+        if not reports:
+            return
+        try:
+            aggregate = await self._add(compute_deltas(reports, sign=-1))
+            scores = [score for score in map(_score, reports) if score is not None]
+            if not scores:
+                return
+            filled = [i for i, count in enumerate(_histogram(aggregate)) if count > 0]
+            if not filled:
+                await dynamodb_service.call_table("aggregates", "update_item", Key=self.key,
+                                                  UpdateExpression="REMOVE min_score, max_score")
+                return
+            # An exact min/max can't be un-ADDed; the histogram's is exact to 0.1
+            if aggregate.get("min_score") is not None and min(scores) <= aggregate["min_score"]:
+                await self._set_bound("min_score", Decimal(filled[0]) / 10, None)
+            if aggregate.get("max_score") is not None and max(scores) >= aggregate["max_score"]:
+                await self._set_bound("max_score", Decimal(filled[-1]) / 10, None)
+        except Exception as e:  # bookkeeping only: never fail the write it follows
+            metrics.increment("aggregates.update_failures")
+            logger.error(f"Failed to update score aggregates: {str(e)}")
+
+    async def get(self) -> Dict[str, Any]:
+        """The stored aggregate item ({} before the first report)"""
+        result = await dynamodb_service.get_item(self.key, table_name="aggregates")
+        if result["success"]:
+            return result["item"]
+        if result["error"] == "Item not found":
+            return {}
+        raise RuntimeError(result["error"])
+
+    async def summary(self) -> Dict[str, Any]:
+        """The /sustainability/scores/summary response"""
+        aggregate = await self.get()
+        if not int(aggregate.get("report_count", 0)):
+            return {"message": "No sustainability reports found"}
+        score_count = int(aggregate.get("score_count", 0))
+        if not score_count:
+            return {"message": "No valid scores found in reports"}
+
+        histogram = _histogram(aggregate)
+        return {
+            "total_reports": int(aggregate["report_count"]),
+            "average_score": round(float(aggregate.get("score_sum", 0)) / score_count, 2),
+            # None until min/max are first set (an ADD can create the item before them)
+            "highest_score": _optional_float(aggregate.get("max_score")),
+            "lowest_score": _optional_float(aggregate.get("min_score")),
+            "score_distribution": {
+                bucket: int(aggregate.get(f"bucket_{bucket}", 0))
+                for bucket in ("excellent", "good", "fair", "poor")
+            },
+            "percentiles": {f"p{p}": _percentile(histogram, p) for p in PERCENTILES},
+            "updated_at": aggregate.get("updated_at")
+        }
+
+    async def _scan_segment(self, segment: int, total_segments: int) -> List[Dict[str, Any]]:
+        reports = []
+        scan_kwargs: Dict[str, Any] = {
+            "Segment": segment,
+            "TotalSegments": total_segments,
+            "ProjectionExpression": "overall_score"
+        }
+        while True:
+            response = await dynamodb_service.call_table("sustainability", "scan", **scan_kwargs)
+            reports.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return reports
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def rebuild(self, segments: int = 8) -> Dict[str, Any]:
+        """Recompute the aggregate from every report with a parallel scan
+
+        Reports written while the scan runs may be missed or double counted;
+        run it when writes are quiet (or run it again).
+        """
+        segment_reports = await asyncio.gather(*(self._scan_segment(i, segments) for i in range(segments)))
+        reports = [report for segment in segment_reports for report in segment]
+        item: Dict[str, Any] = {**self.key, **compute_deltas(reports),
+                                "updated_at": datetime.now().isoformat() + "Z"}
+        item.setdefault("report_count", Decimal(0))
+        scores = [score for score in map(_score, reports) if score is not None]
+        if scores:
+            item["min_score"], item["max_score"] = min(scores), max(scores)
+        await dynamodb_service.call_table("aggregates", "put_item", Item=item)
+        logger.info(f"Rebuilt score aggregates from {len(reports)} reports across {segments} segments")
+        return await self.summary()
+
+
+score_aggregates = ScoreAggregates()
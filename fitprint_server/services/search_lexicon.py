@@ -0,0 +1,128 @@
+"""
+Brand and store matching for Custom Search results
+
+The brand, store and garment keyword lists live in a JSON lexicon
+(SEARCH_LEXICON_PATH, services/search_lexicon.json by default) and are
+compiled once into alternation regexes: one for links and one for titles.
+Keywords only match whole tokens, so 'wiki' no longer matches inside
+'swiki' and 'top' no longer matches 'laptop'; compounds that should
+count (e.g. 'outerwear' for 'wear') are listed in the lexicon. Domains are looked up in a
+host-suffix index, so 'shop.patagonia.com' resolves through 'patagonia.com'.
+Classifying a result is one regex pass over its link, one over its title
+and a dict lookup per host label.
+"""
+import functools
+import json
+import re
+from typing import Any, Dict, Iterable, List
+from urllib.parse import urlsplit
+
+from config import settings
+
+# Keywords are whole tokens: not preceded or followed by a letter or digit
+_TOKEN_START = r"(?<![a-z0-9])"
+_TOKEN_END = r"(?![a-z0-9])"
+
+
+def _alternation(keywords: Iterable[str], plurals: bool = False) -> str:
+    # Longest first so 'girlfriend collective' wins over a shorter keyword at the same spot;
+    # spaces in multi-word keywords also match '-' and '_' (as in URLs)
+    words = sorted({keyword.lower() for keyword in keywords}, key=len, reverse=True)
+    body = "|".join(re.escape(word).replace(r"\ ", r"[\s_-]+") for word in words)
+    suffix = "(?:s|es)?" if plurals else ""
+    return f"(?:{body}){suffix}" if body else "(?!)"
+
+
+def _canonical(match: str) -> str:
+    return re.sub(r"[\s_-]+", " ", match)
+
+
+def _host_suffixes(host: str) -> List[str]:
+    """'a.b.example.com' -> ['a.b.example.com', 'b.example.com', 'example.com', 'com']"""
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels))]
+
+
+class SearchLexicon:
+    """Compiled matchers for one lexicon"""
+
+    def __init__(self, lexicon: Dict[str, Any]):
+        self.fashion_brands = [brand.lower() for brand in lexicon.get("fashion_brands", [])]
+        # keyword -> display name; lexicon order breaks ties between several matches
+        self.sustainable_brands = {keyword.lower(): name for keyword, name in lexicon.get("sustainable_brands", {}).items()}
+        self._brand_rank = {keyword: rank for rank, keyword in enumerate(self.sustainable_brands)}
+        self.store_domains = {domain.lower(): name for domain, name in lexicon.get("store_domains", {}).items()}
+        self.blocked_domains = {domain.lower() for domain in lexicon.get("blocked_domains", [])}
+
+        self._fashion_pattern = re.compile(_TOKEN_START + f"({_alternation(self.fashion_brands)})" + _TOKEN_END)
+        brands = _alternation(self.sustainable_brands)
+        store = _alternation(lexicon.get("store_keywords", []), plurals=True)
+        garment = _alternation(lexicon.get("garment_keywords", []), plurals=True)
+        self._link_pattern = re.compile(
+            _TOKEN_START
+            + f"(?:(?P<blocked>{_alternation(lexicon.get('blocked_keywords', []), plurals=True)})"
+            + f"|(?P<brand>{brands})|(?P<store>{store})|(?P<garment>{garment}))"
+            + _TOKEN_END
+        )
+        self._title_pattern = re.compile(
+            _TOKEN_START
+            + f"(?:(?P<brand>{brands})|(?P<store>{store})|(?P<garment>{garment}))"
+            + _TOKEN_END
+        )
+
+    def fashion_brands_in(self, text: str) -> List[str]:
+        """Distinct fashion brands mentioned in the text"""
+        return list(dict.fromkeys(_canonical(match) for match in self._fashion_pattern.findall(text.lower())))
+
+    def _domain_lookup(self, host: str) -> Dict[str, Any]:
+        for suffix in _host_suffixes(host):
+            if suffix in self.blocked_domains:
+                return {"blocked": True}
+            if suffix in self.store_domains:
+                return {"brand": self.store_domains[suffix]}
+        return {}
+
+    def classify(self, link: str, title: str) -> Dict[str, Any]:
+        """
+        Whether a result is a clothing store and whose.
+
+        Returns {"blocked": bool, "store": bool, "brand": Optional[str]}:
+        blocked results (social, wiki, blog, news...) are never stores; a
+        known store domain, a sustainable brand, or a store keyword or
+        garment in the link or title makes one.
+        """
+        link_lower = link.lower()
+        host = (urlsplit(link_lower).hostname or "") if "//" in link_lower else ""
+        domain = self._domain_lookup(host) if host else {}
+        if domain.get("blocked"):
+            return {"blocked": True, "store": False, "brand": None}
+
+        brand_keywords: List[str] = []
+        store = "brand" in domain
+        for match in self._link_pattern.finditer(link_lower):
+            if match.lastgroup == "blocked":
+                return {"blocked": True, "store": False, "brand": None}
+            if match.lastgroup == "brand":
+                brand_keywords.append(_canonical(match.group()))
+            store = True
+        for match in self._title_pattern.finditer(title.lower()):
+            if match.lastgroup == "brand":
+                brand_keywords.append(_canonical(match.group()))
+            store = True
+
+        brand = domain.get("brand")
+        if brand_keywords:
+            best = min(brand_keywords, key=lambda keyword: self._brand_rank.get(keyword, len(self._brand_rank)))
+            brand = self.sustainable_brands.get(best, best.title())
+        return {"blocked": False, "store": store, "brand": brand}
+
+
+def load_lexicon(path: str) -> SearchLexicon:
+    with open(path, encoding="utf-8") as f:
+        return SearchLexicon(json.load(f))
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_lexicon() -> SearchLexicon:
+    """The lexicon at SEARCH_LEXICON_PATH, compiled on first use"""
+    return load_lexicon(settings.SEARCH_LEXICON_PATH)
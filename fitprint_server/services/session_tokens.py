@@ -0,0 +1,80 @@
+"""
+First-party session tokens
+
+After Google sign-in the API hands out its own short-lived token signed with
+SESSION_SECRET (HMAC-SHA256), carrying the user ID and profile claims.
+Checking one is a local HMAC, so authenticated requests need neither Google
+nor the users table. Format: ``base64url(json claims).base64url(signature)``.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Profile claims copied from the stored user into the token
+PROFILE_CLAIMS = ("email", "full_name", "picture", "last_login")
+
+
+class InvalidSessionToken(ValueError):
+    """Raised for a malformed, tampered or expired session token"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionTokenService:
+    """Issue and check HMAC-signed session tokens"""
+
+    def __init__(self, secret: Optional[str] = settings.SESSION_SECRET,
+                 ttl_seconds: int = settings.SESSION_TOKEN_TTL_SECONDS):
+        if not secret:
+            # Fine for local development; tokens stop working on restart and
+            # aren't accepted by other replicas
+            logger.warning("SESSION_SECRET not set; using a random per-process session key")
+            secret = secrets.token_urlsafe(32)
+        self._key = secret.encode("utf-8")
+        self.ttl_seconds = ttl_seconds
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._key, payload.encode("utf-8"), hashlib.sha256).digest())
+
+    def issue(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Mint a token for a stored user; returns ``{"token", "expires_at"}``"""
+        now = int(time.time())
+        claims = {"sub": user["user_id"], "iat": now, "exp": now + self.ttl_seconds}
+        claims.update({name: user.get(name) for name in PROFILE_CLAIMS if user.get(name) is not None})
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return {"token": f"{payload}.{self._sign(payload)}", "expires_at": claims["exp"]}
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the claims of a valid, unexpired token; raise InvalidSessionToken otherwise"""
+        payload, _, signature = token.partition(".")
+        if not payload or not signature or "." in signature:
+            raise InvalidSessionToken("Malformed session token")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidSessionToken("Bad session token signature")
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise InvalidSessionToken("Malformed session token")
+        if not isinstance(claims, dict) or "sub" not in claims:
+            raise InvalidSessionToken("Malformed session token")
+        if claims.get("exp", 0) <= time.time():
+            raise InvalidSessionToken("Session token expired")
+        return claims
+
+
+session_tokens = SessionTokenService()
@@ -0,0 +1,55 @@
+"""
+Shopping search caches: generated queries and the alternatives they found
+
+Generated queries depend only on brand and product type, and the queries
+for popular garments are near-identical, so both steps of finding
+alternatives are cached across analyses:
+
+- ``search_query_cache``: report_cache_key (brand|product type) -> query,
+  which skips the Gemini call
+- ``shopping_results_cache``: normalized query -> filtered alternatives,
+  which skips the Custom Search calls
+"""
+import re
+from typing import List
+
+from config import settings
+from services.ttl_cache import TwoTierCache
+
+_QUERY_TOKEN = re.compile(r"[a-z0-9&]+(?:['-][a-z0-9]+)*")
+
+# Words that don't change what the search finds; 'buy'/'shop' and
+# 'clothing'/'apparel' are appended to every query anyway
+QUERY_STOPWORDS = {
+    "a", "an", "and", "the", "for", "with", "of", "in", "on", "to", "or",
+    "buy", "shop", "online", "clothing", "apparel"
+}
+
+
+def query_tokens(query: str) -> List[str]:
+    return [token.replace("'", "") for token in _QUERY_TOKEN.findall((query or "").lower())]
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    Cache key for a search query: case, word order, duplicates and stopwords ignored
+
+    'Buy sustainable organic cotton men's T-shirt clothing' and
+    'sustainable men's t-shirt organic cotton' both give
+    'cotton mens organic sustainable t-shirt'.
+    """
+    tokens = sorted({token for token in query_tokens(query) if token not in QUERY_STOPWORDS})
+    return " ".join(tokens)
+
+
+search_query_cache = TwoTierCache(
+    namespace="search_query",
+    max_entries=settings.SHOPPING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEARCH_QUERY_CACHE_TTL_SECONDS
+)
+
+shopping_results_cache = TwoTierCache(
+    namespace="shopping_results",
+    max_entries=settings.SHOPPING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SHOPPING_RESULTS_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,148 @@
+"""
+Two-tier cache: an in-process LRU in front of a shared DynamoDB table with TTL
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from database import dynamodb_service
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Bounded in-process cache whose entries expire after ``ttl_seconds``"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None) -> None:
+        self._entries[key] = (expires_at or time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TwoTierCache:
+    """Cache JSON-serialisable values locally and across replicas
+
+    Reads check the local LRU first, then the shared ``cache`` DynamoDB table,
+    whose ``expires_at`` attribute is the table's TTL attribute. Writes land in
+    the LRU immediately and reach DynamoDB in the background so callers never
+    wait on the shared tier. Hits and misses are counted in ``services.metrics``
+    under ``cache.<namespace>.*``.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, ttl_seconds: float):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUCache(max_entries, ttl_seconds)
+        self._pending_writes: Set[asyncio.Task] = set()
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.namespace}#{key}"
+
+    def _count(self, event: str) -> None:
+        metrics.increment(f"cache.{self.namespace}.{event}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+
+        # The shared tier is an optimisation: any failure reading it is a miss
+        try:
+            result = await dynamodb_service.get_item({"cache_key": self._shared_key(key)}, table_name="cache")
+            if result["success"]:
+                item = result["item"]
+                expires_at = float(item.get("expires_at", 0))
+                # DynamoDB deletes expired items lazily, so check expiry ourselves
+                if expires_at > time.time():
+                    value = json.loads(item["value"])
+                    self.local.set(key, value, expires_at=expires_at)
+                    self._count("shared_hits")
+                    return value
+        except Exception as e:
+            logger.warning(f"Failed to read {self.namespace} cache entry: {e}")
+            self._count("shared_errors")
+
+        self._count("misses")
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self.local.set(key, value, expires_at=expires_at)
+        item = {
+            "cache_key": self._shared_key(key),
+            "value": json.dumps(value),
+            "expires_at": int(expires_at)
+        }
+        task = asyncio.create_task(self._write_shared(item))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    async def _write_shared(self, item: Dict[str, Any]) -> None:
+        result = await dynamodb_service.create_item(item, table_name="cache")
+        if not result["success"]:
+            logger.warning(f"Failed to write {self.namespace} cache entry: {result['error']}")
+
+    async def invalidate(self, key_prefix: str = "") -> Dict[str, int]:
+        """Drop every entry whose key starts with ``key_prefix`` from both tiers
+
+        Local entries are dropped on this replica only; other replicas keep
+        their LRU copies until they expire.
+        """
+        removed = {"local": self.local.delete_prefix(key_prefix), "shared": 0}
+        shared_prefix = self._shared_key(key_prefix)
+        scan_kwargs: Dict[str, Any] = {
+            "FilterExpression": "begins_with(cache_key, :prefix)",
+            "ExpressionAttributeValues": {":prefix": shared_prefix},
+            "ProjectionExpression": "cache_key"
+        }
+        while True:
+            response = await dynamodb_service.call_table("cache", "scan", **scan_kwargs)
+            for item in response.get("Items", []):
+                await dynamodb_service.delete_item({"cache_key": item["cache_key"]}, table_name="cache")
+                removed["shared"] += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        self._count("invalidations")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        counters = metrics.snapshot()["counters"]
+        prefix = f"cache.{self.namespace}."
+        stats = {name[len(prefix):]: value for name, value in counters.items() if name.startswith(prefix)}
+        stats["local_entries"] = len(self.local)
+        return stats
@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.custom_search_client import CustomSearchClient, CustomSearchError
+
+BASE_URL = "https://search.stub/customsearch/v1"
+
+
+def stub_client(responses, **kwargs):
+    """A client whose requests are answered in turn by ``responses``
+
+    Each entry is an httpx.Response or an exception to raise. Returns the
+    client and the list of requests it sent.
+    """
+    requests = []
+    pending = list(responses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        response = pending.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client = CustomSearchClient("test-key", base_url=BASE_URL, retry_backoff=0,
+                                transport=httpx.MockTransport(handler), **kwargs)
+    return client, requests
+
+
+def run(client, **params):
+    async def call():
+        try:
+            return await client.list(**params)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(call())
+
+
+def test_list_returns_decoded_json_and_sends_key():
+    client, requests = stub_client([httpx.Response(200, json={"items": [{"title": "Organic tee"}]})])
+
+    result = run(client, q="organic tee", cx="engine", num=10, start=11)
+
+    assert result == {"items": [{"title": "Organic tee"}]}
+    assert len(requests) == 1
+    params = requests[0].url.params
+    assert params["key"] == "test-key"
+    assert params["q"] == "organic tee"
+    assert params["start"] == "11"
+
+
+@pytest.mark.parametrize("status_code", [500, 503])
+def test_server_errors_are_retried(status_code):
+    client, requests = stub_client([
+        httpx.Response(status_code, json={"error": {"message": "try later"}}),
+        httpx.Response(200, json={"items": []}),
+    ], max_retries=1)
+
+    assert run(client, q="tee") == {"items": []}
+    assert len(requests) == 2
+
+
+def test_retries_are_bounded():
+    client, requests = stub_client([
+        httpx.Response(503, json={"error": {"message": "backend"}}),
+        httpx.Response(503, json={"error": {"message": "backend"}}),
+    ], max_retries=1)
+
+    with pytest.raises(CustomSearchError) as error:
+        run(client, q="tee")
+    assert error.value.status_code == 503
+    assert "backend" in str(error.value)
+    assert len(requests) == 2
+
+
+def test_per_call_max_retries_overrides_the_client():
+    client, requests = stub_client([httpx.Response(503, json={"error": {"message": "backend"}})], max_retries=3)
+
+    with pytest.raises(CustomSearchError):
+        run(client, q="tee", max_retries=0)
+    assert len(requests) == 1
+    assert "max_retries" not in requests[0].url.params
+
+
+@pytest.mark.parametrize("status_code, message", [(400, "bad cx"), (429, "quota exceeded")])
+def test_client_errors_and_quota_errors_are_not_retried(status_code, message):
+    client, requests = stub_client([httpx.Response(status_code, json={"error": {"message": message}})], max_retries=3)
+
+    with pytest.raises(CustomSearchError) as error:
+        run(client, q="tee")
+    assert error.value.status_code == status_code
+    assert message in str(error.value)
+    assert len(requests) == 1
+
+
+def test_timeouts_propagate_without_retry():
+    client, requests = stub_client([httpx.ReadTimeout("slow stub")], max_retries=3)
+
+    with pytest.raises(httpx.TimeoutException):
+        run(client, q="tee")
+    assert len(requests) == 1